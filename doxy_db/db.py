@@ -1,17 +1,101 @@
+import itertools
+import os
+import re
 import sqlite3
+import threading
 
 from . import sql
 from . import views
 from . import exceptions
 from . import makes
+from . import sidecar
+
+# read-only serving defaults; see DoxygenSQLite3(read_only=True)
+READ_ONLY_MMAP_SIZE = 256 * 1024 * 1024
+READ_ONLY_CACHE_SIZE = -64 * 1024  # negative: KiB, not pages
+READ_ONLY_CACHED_STATEMENTS = 512
+
+# The tables behind the def, rel, inner_outer and *_xrefs views (plus meta); enough to serve every stock view. See DoxygenSQLite3(in_memory=...)
+VIEW_TABLES = (
+    "meta",
+    "refid",
+    "compounddef",
+    "memberdef",
+    "contains",
+    "member",
+    "compoundref",
+    "reimplements",
+    "xrefs",
+)
+
+# the start of a CREATE statement, up to the name of what it creates (where a schema name goes)
+_create_in = re.compile(
+    r"^(\s*CREATE\s+(?:UNIQUE\s+)?(?:TABLE|VIEW|INDEX)\s+(?:IF\s+NOT\s+EXISTS\s+)?)",
+    re.IGNORECASE,
+)
+
+# names for shared in-memory databases
+_memory_names = itertools.count()
+
+
+def _file_identity(path):
+    """Return (device, inode) of the file at path, or None if it can't be stat'ed."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class ConnectionPool(object):
+    """
+    Hand out one sqlite3 connection per thread.
+
+    A sqlite3 connection can't safely be shared between threads, but separate connections to the same database can read in parallel. Handing each thread its own connection lets a single compiled manual serve a thread pool without serializing requests or rebuilding its views per worker.
+    """
+
+    _connect = _local = _lock = _connections = None
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread ident -> connection; lets us close connections left by dead threads
+        self._connections = {}
+
+    def get(self):
+        try:
+            return self._local.connection
+        except AttributeError:
+            pass
+
+        connection = self._local.connection = self._connect()
+        with self._lock:
+            live = {x.ident for x in threading.enumerate()}
+            for ident in set(self._connections) - live:
+                self._connections.pop(ident).close()
+            self._connections[threading.get_ident()] = connection
+
+        return connection
+
+    def close(self):
+        """Close every connection; threads get fresh ones on next use."""
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+            self._local = threading.local()
 
 
 class DoxygenSQLite3(object):
     """TODO"""
 
     indexpage = None
-    connection = None
     types = None
+    statement_cache = None
+    read_only = False
+    # the def table our queries read; indexed=True points this at the sidecar's copy
+    def_table = "def"
 
     def __init__(
         self,
@@ -19,19 +103,78 @@ class DoxygenSQLite3(object):
         type_factory=makes.default_types,
         atom_factory=makes.default_atoms,
         relation_factory=makes.default_relations,
+        read_only=False,
+        mmap_size=READ_ONLY_MMAP_SIZE,
+        cache_size=READ_ONLY_CACHE_SIZE,
+        cached_statements=READ_ONLY_CACHED_STATEMENTS,
+        in_memory=False,
+        sidecar_path=None,
+        indexed=False,
     ):
+        """
+        Open the Doxygen database at uri.
+
+        Doxygen databases are generated once and then only read, so read_only=True opens the file immutable (no locking or change detection), refuses writes, memory-maps up to mmap_size bytes (shared with other processes via the OS page cache), and sizes sqlite's page cache and Python's statement cache up. mmap_size, cache_size, and cached_statements only apply in read-only mode.
+
+        in_memory=True copies the whole database into memory at startup (via the sqlite backup API) so queries never touch the disk; pass a collection of table names (i.e., VIEW_TABLES) instead to only load those tables (every view is still defined). The in-memory copy is shared by all of this object's connections, and so is an in-memory copy of the sidecar (see below) that each sidecar build is copied into as it finishes.
+
+        Indexes and derived tables live in a sidecar database (see sidecar.py) attached to every connection; it's a temporary file unless you supply a sidecar_path, in which case each version (meta.generated_at) of the Doxygen database gets its own persistent sidecar file beside that path. indexed=True builds indexed copies of def and the relation tables there, and points this object's queries at them.
+
+        Every connection reads the file that was at uri when this object opened it. If it has since been replaced (i.e., the docs were regenerated), threads that don't have a connection yet get StaleDatabase instead of silently reading the new file; build a new object to read that.
+        """
         self.types = type_factory and type_factory()
         self.atoms = atom_factory and atom_factory()
         self.relations = relation_factory and relation_factory()
 
-        # use URI so that a missing file will error, not implicitly create
-        connection = sqlite3.connect("file:{}?mode=rw".format(uri), uri=True)
-        connection.row_factory = self.types.row_factory()
-        connection.execute("PRAGMA temp_store = MEMORY;")
-        self.connection = connection
+        self.uri = uri
+        self.read_only = read_only
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.in_memory = in_memory
+
+        if in_memory:
+            # memdb (rather than shared-cache) so that pooled readers don't serialize on shared-cache locks
+            self._memory_uri = "file:/doxy_db_memory_{}?vfs=memdb".format(
+                next(_memory_names)
+            )
+            # this connection owns the shared in-memory copy; it lives as long as we do
+            self._memory = self._load_into_memory(
+                self._memory_uri, None if in_memory is True else in_memory
+            )
+
+        # the file our connections must all read; see _connect
+        self._identity = None if in_memory else _file_identity(uri)
+
+        self.sidecar = sidecar.Sidecar(self, sidecar_path)
+        self._pool = ConnectionPool(self._connect)
+        # connect now so that a bad uri fails here, not on the first query
+        self._pool.get()
+
+        if indexed:
+            self.sidecar.ensure("indexes")
+            self.def_table = sidecar.qualify("def")
+            for name in list(self.atoms.names()):
+                atom = self.atoms.get(name)
+                self.atoms.define(
+                    name,
+                    sidecar.qualify(atom.table),
+                    atom.parent_col_prefix,
+                    atom.child_col_prefix,
+                )
+
+        # prepared search statements, shared by all views built on this API
+        self.statement_cache = sql.StatementCache()
 
         # _def is a stepping stone to bigger queries
-        self._def = sql.Statement(self).table("def", "rowid")._from("def base")
+        self._def = (
+            sql.Statement(self)
+            .table("def", "rowid")
+            ._from("{} base".format(self.def_table))
+            ._id("base.rowid")
+        )
+        # hydrates stubs from rowids (i.e., id-first searches)
+        self._stubs = sql.Statement(self, self._def).prepare()
 
         self.relview = views.RelationView(
             sql.Statement(self, self._def)._select("*")._where("base.rowid=?")
@@ -64,26 +207,122 @@ class DoxygenSQLite3(object):
         """
         return func(self)
 
+    @property
+    def connection(self):
+        """This thread's connection to the database (see ConnectionPool)."""
+        return self._pool.get()
+
+    def close(self):
+        self._pool.close()
+        self.sidecar.close()
+        if self.in_memory:
+            self._memory.close()
+
+    def _load_into_memory(self, memory_uri, tables=None):
+        """Copy the database (or just tables, if specified) into a shared in-memory database at memory_uri."""
+        source_uri = "file:{}?mode=ro".format(self.uri)
+        memory = sqlite3.connect(memory_uri, uri=True, check_same_thread=False)
+
+        if tables is None:
+            source = sqlite3.connect(source_uri, uri=True)
+            try:
+                source.backup(memory)
+            finally:
+                source.close()
+            return memory
+
+        # attach the copy to the source, not vice versa; databases attached to a memdb connection open through memdb too
+        source = sqlite3.connect(source_uri, uri=True)
+        try:
+            source.execute("ATTACH DATABASE ? AS memory", (memory_uri,))
+            schema = source.execute(
+                "SELECT type, name, tbl_name, sql FROM main.sqlite_master WHERE sql NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END"
+            ).fetchall()
+            for kind, name, table, ddl in schema:
+                if kind == "view" or (
+                    table in tables if kind == "index" else name in tables
+                ):
+                    source.execute(_create_in.sub(r"\1memory.", ddl, count=1))
+                if kind == "table" and name in tables:
+                    source.execute(
+                        "INSERT INTO memory.[{0}] SELECT * FROM main.[{0}]".format(name)
+                    )
+            source.commit()
+        finally:
+            source.close()
+        return memory
+
+    def _connect(self, query_only=None, sidecar_writer=False):
+        # the pool guarantees one thread per connection; check_same_thread only gets in the way of closing connections left behind by dead threads
+        if self.in_memory:
+            connection = sqlite3.connect(
+                self._memory_uri, uri=True, check_same_thread=False
+            )
+        elif self.read_only:
+            connection = sqlite3.connect(
+                "file:{}?mode=ro&immutable=1".format(self.uri),
+                uri=True,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA mmap_size = {:d};".format(self.mmap_size))
+            connection.execute("PRAGMA cache_size = {:d};".format(self.cache_size))
+        else:
+            # use URI so that a missing file will error, not implicitly create
+            connection = sqlite3.connect(
+                "file:{}?mode=rw".format(self.uri), uri=True, check_same_thread=False
+            )
+
+        # rowids, cached views and statements all describe the file we opened first
+        if self._identity and _file_identity(self.uri) != self._identity:
+            connection.close()
+            raise exceptions.StaleDatabase(
+                "{} has been replaced since it was opened".format(self.uri)
+            )
+
+        self.sidecar.attach(connection, writer=sidecar_writer)
+
+        if self.read_only if query_only is None else query_only:
+            connection.execute("PRAGMA query_only = ON;")
+
+        connection.row_factory = self.types.row_factory()
+        connection.execute("PRAGMA temp_store = MEMORY;")
+        return connection
+
+    def stubs(self, rowids):
+        """Return stub records for rowids, in the same order, using as few queries as possible (None for unknown rowids)."""
+        found = dict(self._stubs.bulk(rowids))
+        return [found.get(x) for x in rowids]
+
     # ---------------------------------- #
 
     # View factories; used to extend the API and generate manual sections.
-    def topmost(self, kinds, brief_description, search_relation=None):
+    def topmost(self, kinds, brief_description, search_relation=None, search_path=None):
         """
         Generate a view that will find compounds of 'kinds' that have no parent.
 
         Note: I thought I could build something similar to the default HTML manual by throwing the page, class, and group kinds through topmost; I was profoundly wrong. There a number of small caveats regarding what appears in those lists and which relations dictate the hierarchy it encodes.
+
+        The parentless set is computed once per database (and set of kinds) into an indexed sidecar table, so the view's base query is an index lookup rather than an anti-join over inner_outer.
         """
-        return views.ListView(
+        name, key, build = sidecar.topmost_build(kinds)
+        self.sidecar.define(name, build)
+        self.sidecar.ensure(name)
+
+        view = views.ListView(
             sql.Statement(self, self._def)._where(
-                "base.kind in ('{kinds}') and base.rowid not in (select distinct rowid from inner_outer where [kind:1] in ('{kinds}'))".format(
-                    kinds="','".join(kinds)
+                "base.rowid in (select compound_rowid from sidecar.topmost where kinds={})".format(
+                    sql.quote(key)
                 )
             ),
             brief_description,
             search_relation=search_relation,
+            search_path=search_path,
         )
+        view._requires(name)
+        return view
 
-    def kinds(self, kinds, brief_description, search_relation=None):
+    def kinds(self, kinds, brief_description, search_relation=None, search_path=None):
         """Generate a view that will find  elements of 'kinds' """
         return views.ListView(
             sql.Statement(self, self._def)._where(
@@ -91,9 +330,10 @@ class DoxygenSQLite3(object):
             ),
             brief_description,
             search_relation=search_relation,
+            search_path=search_path,
         )
 
-    def make_compound_tree(self, kinds, search_relation):
+    def make_compound_tree(self, kinds, search_relation, search_path=None):
         """
         Generate a factory that itself generates views locked on a certain compound.
 
@@ -125,6 +365,7 @@ class DoxygenSQLite3(object):
                         )
                     ),
                     search_relation=search_relation,
+                    search_path=search_path,
                 )
             elif "name" in kwarg:
                 return views.DocView(
@@ -136,6 +377,7 @@ class DoxygenSQLite3(object):
                         )
                     ),
                     search_relation=search_relation,
+                    search_path=search_path,
                 )
             else:
                 raise exceptions.InvalidUsage(
@@ -144,56 +386,39 @@ class DoxygenSQLite3(object):
 
         return compound_tree
 
-    # TODO: I'm skipping a potentially useful method for scaffolding a doc section based on searching a directory for compounds. I took 4 quick swings at this functionality that all ran into intractable problems. I don't want to force a solution, and I don't want to get bogged down in another big segment of functionality before launching.
-    #
-    # That said, I do want to preserve progress ths far in case it is useful.
-    #
-    # Here's a basic query that lets you search a directory by name and enumerate its compounds:
-    #   select def.* from contains join def on contains.inner_rowid=def.rowid where contains.outer_rowid in (select file.rowid from contains join compounddef on contains.outer_rowid=compounddef.rowid join def file on file.rowid=contains.inner_rowid where compounddef.name='obj');
-    #
-    # This list-view-based model kinda works for the first couple steps of a deeper search:
-    # >>> x.doc_search("std")
-    # >>> x.doc_search("std obj_armour")
-    #
-    # But the last part falls flat on its face:
-    #
-    # >>> x.doc_search("std obj_armour query_ego")
-    # doxy_db.exceptions.MalformedQuery: ('Malformed query', "SELECT [innercompounds].* FROM def base JOIN contains as relative ON base.rowid=relative.outer_rowid JOIN def [innercompounds] ON [innercompounds].rowid=relative.inner_rowid WHERE contains.outer_rowid in (select file.rowid from contains join compounddef on contains.outer_rowid=compounddef.rowid join def as file on file.rowid=contains.inner_rowid where compounddef.name='obj') AND base.rowid=? AND innercompounds.name=?", (381, 'query_ego'))
-    #
-    # This generated query is broken in like 3 places:
-    #
-    # - the outer contains.outer_rowid would need to be 'relative.outer_rowid'
-    # - the first join contains as relative needs to be on relative.inner_rowid
-    # - and, most critically, the query needs additional layers to even begin to actually query members of the intended compound.
-    #
-    # At a conceptual level, I think this approach runs into a few problems (there might be a less-disruptive approach...):
-    # - We need to extend the search_relation concept to an additional layer of depth in order to support first jumping from the directory compound to the appropriate sub-compound and then again to its members
-    #   - we could in theory just make the feature a little more rigid, and don't allow a restrictable list? or, use inner_compound, but add a custom 'where kind=?' to the query and let people specify a text kind--but we'll also need to overload the parts of the search/find process that lean on relations for depth search.
-    # - I'm not entirely sure if the minimal query wrapper API I built is actually capable of handling queries nesting through this many joins or nested selects very robustly
-    #   - and it's probably a fool's-errand to try to develop it to that level of edge-case support
-    #   - one potential out might be a more basic raw-query mode. The point of the wrapper is to make easier to build up queries that reference each other's parts, but if this task really is an edge case, that scaffolding isn't essential.
-    # - It probably needs its own view or view abstraction; there's just too much edge-case stuff.
-    #
-    # def directory(self, name, search_relation=None):
-    #     # TODO Not quite sure where, but somewhere I need to test and/or doc this behavior.
-    #     if search_relation is None:
-    #         search_relation = self.relations.get("innercompounds")
-
-    #     return views.ListView(
-    #         sql.Statement(self, self._def)
-    #         ._select("def.*")
-    #         ._from("contains")
-    #         ._where("contains.outer_rowid in (select file.rowid from contains join compounddef on contains.outer_rowid=compounddef.rowid join def as file on file.rowid=contains.inner_rowid where compounddef.name='{}')".format(name))
-    #         ._join(conditions="def on contains.inner_rowid=def.rowid"),
-    #         "Contents of directory {}".format(name),
-    #         search_relation=search_relation
-    #     )
-    #
-    # Some other notes I had on this concept elsewhere:
-    # - we could cheat and substring fns:
-    #   select * from compounddef where kind='class' and id_file in (select rowid from files where name like 'obj/doxy_guide%');
-    #   man.mount("std", struct().where(id_file=file().where(name like path%)))
-    # - I could imagine a chainable API like: classes(actions).members(**optionally kind="function")
+    def directory(
+        self,
+        name,
+        brief_description=None,
+        kinds=None,
+        search_relation=None,
+        search_path=None,
+    ):
+        """
+        Generate a view listing the compounds (optionally, just those of 'kinds') anywhere under the directory named 'name'.
+
+        Searches drill down from the listed compounds through search_relation (members, by default) and search_path in a single query, so something like "std obj_armour query_ego" finds the query_ego member of the obj_armour compound in the std directory's view.
+        """
+        # the directory's contents come from the containment closure
+        closure = sidecar.qualify("closure_contains")
+        self.sidecar.require(closure)
+
+        statement = sql.Statement(self, self._def)._where(
+            "base.rowid in (select inner_rowid from sidecar.closure_contains where outer_rowid in (select rowid from def where kind='dir' and name='{}'))".format(
+                name.replace("'", "''")
+            )
+        )
+        if kinds:
+            statement.where("base.kind in ('{}')".format("','".join(kinds)))
+
+        view = views.ListView(
+            statement,
+            brief_description or "Contents of directory {}".format(name),
+            search_relation=search_relation or self.relations.get("members"),
+            search_path=search_path,
+        )
+        view._requires(self.sidecar.tables[closure])
+        return view
 
     def root_page(self, field, name):
         return views.DocView(
@@ -40,6 +40,14 @@ class StatementArgumentMismatch(InvalidUsage):
     pass
 
 
+class StaleSnapshot(InvalidUsage):
+    pass
+
+
+class StaleDatabase(InvalidUsage):
+    pass
+
+
 class IncompatibleBaseQuery(InvalidUsage):
     def __init__(self, message, view, query_ob, results):
         message = "{}: {}".format(view.__class__.__name__, message)
@@ -0,0 +1,156 @@
+"""
+In-memory name indexes for searching records by name (exactly, by substring, or fuzzily) without scanning them.
+"""
+
+import heapq
+
+from array import array
+from collections import Counter
+
+# postings are kept for every substring up to this long; longer queries intersect these
+GRAM_SIZE = 3
+
+
+def grams(string, size=GRAM_SIZE):
+    """Return the set of substrings of string that are up to size characters long."""
+    return {
+        string[start : start + length]
+        for length in range(1, size + 1)
+        for start in range(0, len(string) - length + 1)
+    }
+
+
+class NameIndex(object):
+    """
+    Index records by name, for exact and substring (partial) lookups.
+
+    Exact names map straight to the first record with that name. For partial matches, every substring of up to GRAM_SIZE characters has a postings list of the positions of records whose names contain it; a longer query only has to verify the records in the intersection of its n-grams' postings.
+
+    Records are added incrementally (see add) and keep their insertion order in results.
+    """
+
+    records = exact = postings = None
+
+    def __init__(self, records=()):
+        self.records = []
+        self.exact = {}
+        self.postings = {}
+        self.add(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, records):
+        for record in records:
+            position = len(self.records)
+            self.records.append(record)
+            self.exact.setdefault(record.name, record)
+            for gram in grams(record.name):
+                self.postings.setdefault(gram, []).append(position)
+
+    def _candidates(self, topic):
+        """Return the positions of records that might contain topic, in order."""
+        if not topic:
+            return range(len(self.records))
+        if len(topic) <= GRAM_SIZE:
+            return self.postings.get(topic, ())
+
+        # rarest grams first, so the intersection shrinks fast
+        postings = sorted(
+            (self.postings.get(x, ()) for x in grams(topic) if len(x) == GRAM_SIZE),
+            key=len,
+        )
+        candidates = set(postings[0])
+        for positions in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(positions)
+        return sorted(candidates)
+
+    def partial(self, topic):
+        """Return records whose names contain topic."""
+        return [
+            self.records[x]
+            for x in self._candidates(topic)
+            if topic in self.records[x].name
+        ]
+
+    def query(self, topic):
+        """Return [record] for an exact name match, else partial matches (in insertion order)."""
+        if topic in self.exact:
+            return [self.exact[topic]]
+        return self.partial(topic)
+
+
+# fuzzy matches less similar than this (see FuzzyIndex.search) aren't worth returning
+FUZZY_THRESHOLD = 0.3
+
+
+def trigrams(string):
+    """Return the set of (case-folded, padded) trigrams in string; padding lets short names and word starts count."""
+    padded = "  {} ".format(string.lower())
+    return {padded[start : start + 3] for start in range(0, len(padded) - 2)}
+
+
+class FuzzyIndex(object):
+    """
+    Index names by trigram, for typo-tolerant (fuzzy) lookups.
+
+    Each distinct name gets an id; postings map every trigram to a compact array of the ids of names that contain it. A search only touches the postings of the query's own trigrams to count shared trigrams per name, scores them by Dice similarity, and keeps the best few with a bounded heap.
+    """
+
+    names = rowids = sizes = postings = _ids = None
+
+    def __init__(self, records=()):
+        self.names = []
+        # name id -> rowids of records with that name
+        self.rowids = []
+        # name id -> number of trigrams in the name
+        self.sizes = array("I")
+        self.postings = {}
+        self._ids = {}
+        self.add(records)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, records):
+        """Add (rowid, name) records."""
+        for rowid, name in records:
+            if name is None:
+                continue
+            try:
+                self.rowids[self._ids[name]].append(rowid)
+                continue
+            except KeyError:
+                pass
+
+            ident = self._ids[name] = len(self.names)
+            self.names.append(name)
+            self.rowids.append([rowid])
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, array("I")).append(ident)
+
+    def search(self, topic, limit=10, threshold=FUZZY_THRESHOLD):
+        """Return the rowids of up to limit records with the names most similar to topic, best first."""
+        grams = trigrams(topic)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        best = heapq.nlargest(
+            limit,
+            (
+                (2.0 * count / (len(grams) + self.sizes[ident]), -ident)
+                for ident, count in shared.items()
+            ),
+        )
+
+        rowids = []
+        for score, ident in best:
+            if score < threshold:
+                break
+            rowids.extend(self.rowids[-ident])
+        return rowids[:limit]
@@ -8,7 +8,11 @@ It may meet your needs out of the box, but it probably won't meet everyone's. Ev
 
 from lxml import html
 from functools import lru_cache
+from collections import OrderedDict
 import json
+import threading
+
+from . import exceptions, sidecar, sql
 
 
 #
@@ -186,12 +190,109 @@ class Formatter(object):
     def search(self, results):
         return self.cast.dict(results=self.populate(results.results))
 
+    def paged(self, page):
+        return self.cast.dict(
+            results=self.populate(page.results), next_token=page.next_token
+        )
+
 
 class JSONFormatter(Formatter):
     def format(self, record):
         return json.dumps(record)
 
 
+# marks the end of a stream's records (see Interface.stream)
+_DONE = object()
+
+
+def document_rowids(ob):
+    """Return the rowids of every document in a manual return value (records, searches, pages, sections, manuals)."""
+    rowids = set()
+    pending = [ob]
+    while pending:
+        x = pending.pop()
+        fields = getattr(x, "_fields", None)
+        if fields is None:
+            if isinstance(x, (list, tuple, set, frozenset)):
+                pending.extend(x)
+            continue
+        if "rowid" in fields:
+            rowids.add(x.rowid)
+        pending.extend(
+            getattr(x, name)
+            for name in ("results", "children", "root", "documents", "sections")
+            if name in fields
+        )
+    return rowids
+
+
+class DependencyCache(object):
+    """
+    An LRU cache whose entries remember which documents (by rowid) they were built from.
+
+    When the manual behind it is regenerated, invalidate() drops only the entries built from documents that changed. Structural entries (i.e., searches, whose results depend on which documents exist and what they're named, not just on what they returned) can also be dropped wholesale when documents are added, removed, or renamed.
+
+    Thread-safe. Values computed while an invalidation happens aren't stored, since they may come from the old manual.
+    """
+
+    maxsize = hits = misses = _entries = _lock = _generation = None
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        # key -> (value, rowids, structural); in least- to most-recently used order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute, structural=False):
+        """Return the value cached under key, else compute() one; compute returns (value, rowids it depends on)."""
+        with self._lock:
+            try:
+                entry = self._entries[key]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            except KeyError:
+                self.misses += 1
+                generation = self._generation
+
+        value, rowids = compute()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (value, frozenset(rowids), structural)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, rowids, structural=False, then=None):
+        """
+        Drop entries that depend on any of rowids (and every structural entry, if structural); return how many were dropped.
+
+        then (a callable) runs while the cache is still locked, so a caller can swap in a new manual without any lookups landing in between.
+        """
+        rowids = frozenset(rowids)
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key
+                for key, (_value, depends, is_structural) in self._entries.items()
+                if (structural and is_structural) or not depends.isdisjoint(rowids)
+            ]
+            for key in stale:
+                del self._entries[key]
+            if then:
+                then()
+        return len(stale)
+
+    def clear(self):
+        self.invalidate((), then=self._entries.clear)
+
+
 class Interface(object):
     """
     High-level interface to a database manual.
@@ -210,20 +311,128 @@ class Interface(object):
     However, the interface should have no knowledge about this at the call level. It just knows how to use a formatter unwrap/convert the manual's return types.
     """
 
-    manual = structure = search_tuple = _description = None
+    manual = structure = search_tuple = _description = _doc_structure = None
+    build = cache = _reload_lock = _users_lock = _users = _retired = None
+
+    def __init__(self, manual, formatter, build=None, cache_size=512):
+        """
+        Serve manual, formatting its results with formatter.
 
-    def __init__(self, manual, formatter):
+        Pass build (a callable returning a new manual, i.e. functools.partial(manual.default_doxygen_manual, uri)) to enable reload(), which swaps in a rebuilt manual when the database is regenerated.
+        """
         self.manual = manual
-        self._structure = manual.doc_structure()
         self.fmt = formatter
+        self.build = build
         # TODO: ideal addition to the search tuple is information about the query (and possibly information about how it was executed), which suggests this information (and the tuple) might be better generated down in the manual?
         self.search_tuple = manual.types.get("search")
 
-        # set up LRU caches; we can't use the decorator because they'll globally cache... :(
-        self.fetch = lru_cache(maxsize=512)(self.fetch)
-        self.search = lru_cache(maxsize=512)(self.search)
-        self.brief = lru_cache(maxsize=512)(self.brief)
-        self.doc = lru_cache(maxsize=512)(self.doc)
+        # per-instance, dependency-aware cache (see reload)
+        self.cache = DependencyCache(maxsize=cache_size)
+        self._reload_lock = threading.Lock()
+        # id(manual) -> how many calls are using it, and swapped-out manuals waiting for that to reach 0 (see _serve)
+        self._users_lock = threading.Lock()
+        self._users = {}
+        self._retired = {}
+        if build:
+            # the baseline that a regenerated database gets compared against; must be read before the file is replaced
+            manual.fingerprint()
+
+    def _cached(self, key, compute):
+        """Return the formatted result of compute(manual) (an unformatted manual result) from the cache; searches are structural."""
+
+        def build():
+            ob = self._serve(compute)
+            return self.fmt(ob), document_rowids(ob)
+
+        return self.cache.get(key, build, structural=True)
+
+    def _serve(self, use):
+        """
+        Return use(manual) for the current manual, which counts as in use until then, so reload won't close it out from under the call.
+
+        A manual won't open new connections once its database has been regenerated (see DoxygenSQLite3), so threads (or sidecar builds) it hasn't served before can't use it after that. Rather than fail, calls on those wait for reload to swap in the new manual (running the reload, if none is under way) and try again.
+        """
+        while True:
+            manual = self._acquire()
+            try:
+                return use(manual)
+            except exceptions.StaleDatabase:
+                if not self.build:
+                    raise
+            finally:
+                self._release(manual)
+            self._reload(replacing=manual)
+
+    def _acquire(self):
+        with self._users_lock:
+            manual = self.manual
+            self._users[id(manual)] = self._users.get(id(manual), 0) + 1
+        return manual
+
+    def _release(self, manual):
+        with self._users_lock:
+            self._users[id(manual)] -= 1
+            if self._users[id(manual)]:
+                return
+            del self._users[id(manual)]
+            if self._retired.pop(id(manual), None) is None:
+                return
+        manual.close()
+
+    def _retire(self, manual):
+        """Close a swapped-out manual, or leave that to the last call still using it."""
+        with self._users_lock:
+            if id(manual) in self._users:
+                self._retired[id(manual)] = manual
+                return
+        manual.close()
+
+    def stale(self):
+        """True if the manual's database has been regenerated since the manual was built."""
+        return self.manual.current_generated_at() != self.manual.meta().generated_at
+
+    def reload(self, force=False, background=False):
+        """
+        Rebuild the manual if its database has been regenerated, and swap the new one in.
+
+        The current manual keeps serving while build() makes the new one, except on threads it hasn't served before, which wait for the new one (see _serve). The swap happens under the cache's lock, along with invalidating just the cached results built from documents that changed (plus every cached search, if documents were added, removed or renamed); see Manual.changes. The old manual is closed once calls still using it finish.
+
+        With background=True, this runs in a daemon thread, which it returns. Otherwise, returns True if it swapped in a new manual.
+        """
+        if not self.build:
+            raise exceptions.InvalidUsage(
+                "Can't reload an interface created without a build callable"
+            )
+
+        if background:
+            thread = threading.Thread(target=self.reload, args=(force,), daemon=True)
+            thread.start()
+            return thread
+
+        return self._reload(force)
+
+    def _reload(self, force=False, replacing=None):
+        """Do reload's work; with replacing (a manual found to be stale), only if it hasn't been swapped out already."""
+        with self._reload_lock:
+            if replacing is not None:
+                if self.manual is not replacing:
+                    return False
+            elif not (force or self.stale()):
+                return False
+
+            old = self.manual
+            new = self.build()
+            changed, structural = old.changes(new)
+
+            def swap():
+                self.manual = new
+                if changed:
+                    self._doc_structure = None
+
+            self.cache.invalidate(changed, structural=structural, then=swap)
+            # otherwise every reload leaks its pooled connections and sidecar
+            self._retire(old)
+            return True
 
     def _disambiguate(self, results):
         return self.search_tuple(results)
@@ -233,24 +442,66 @@ class Interface(object):
     #     return self.fmt(self._disambiguate(results))
 
     def fetch(self, rowid):
-        return self.manual.doc_fetch(rowid)
+        return self.cache.get(
+            ("fetch", rowid),
+            lambda: (self._serve(lambda manual: manual.doc_fetch(rowid)), (rowid,)),
+        )
+
+    def fetch_many(self, rowids):
+        """Fetch the records for many rowids at once (see Manual.doc_fetch_many)."""
+        return self._serve(lambda manual: manual.doc_fetch_many(rowids))
+
+    def search(self, query, size=None, token=None, mode=None):
+        """
+        Search the manual.
+
+        Pass a page size to get a single page of results (in rowid order) and a next_token for requesting the following page.
+
+        With mode="text", search names and descriptions for every term in query instead, returning up to size (or manual.TEXT_SEARCH_LIMIT) results ranked by relevance. Ranked results aren't paged.
 
-    def search(self, query):
-        return self.fmt(self.search_tuple(self.manual.doc_search(query)))
+        With mode="fuzzy", fall back on the closest names when nothing matches (see Manual.doc_search). Fuzzy results aren't paged either.
+        """
+        if mode not in (None, "text", "fuzzy"):
+            raise exceptions.InvalidUsage("Unknown search mode '{}'".format(mode))
+        if mode == "text" and token:
+            raise exceptions.InvalidUsage("Text searches don't support page tokens")
+        if mode == "fuzzy" and (size is not None or token):
+            raise exceptions.InvalidUsage("Fuzzy searches don't support paging")
+        if mode is None and size is not None:
+            sql.check_page_size(size)
 
-    def _brief(self, query):
-        results = self.manual.doc_search(query)
+        return self._cached(
+            ("search", query, size, token, mode),
+            lambda manual: self._search(query, size, token, mode, manual),
+        )
+
+    def _search(self, query, size=None, token=None, mode=None, manual=None):
+        manual = manual or self.manual
+        if mode == "text":
+            return self.search_tuple(
+                manual.text_search(sidecar.match_terms(query), size)
+            )
+        elif mode == "fuzzy":
+            return self.search_tuple(manual.doc_search(query, fuzzy=True))
+
+        if size is not None:
+            return manual.doc_search_page(query, size, token)
+        return self.search_tuple(manual.doc_search(query))
+
+    def _brief(self, query, manual=None):
+        manual = manual or self.manual
+        results = manual.doc_search(query)
         if len(results) == 1:
             return results[0]
         else:
             return self._disambiguate(results)
 
     def brief(self, query):
-        ob = self._brief(query)
-        return self.fmt(ob)
+        return self._cached(("brief", query), lambda manual: self._brief(query, manual))
 
-    def _doc(self, query):
-        results = self.manual.doc_search(query)
+    def _doc(self, query, manual=None):
+        manual = manual or self.manual
+        results = manual.doc_search(query)
         stub = None
         if len(results) == 1:
             stub = results[0]
@@ -260,8 +511,45 @@ class Interface(object):
         return self.fetch(stub.rowid)
 
     def doc(self, query):
-        ob = self._doc(query)
-        return self.fmt(ob)
+        return self._cached(("doc", query), lambda manual: self._doc(query, manual))
+
+    @property
+    def _structure(self):
+        # built on first use, so an interface (and its manual's sections) start up without listing everything
+        if self._doc_structure is None:
+            self._doc_structure = self._serve(lambda manual: manual.doc_structure())
+        return self._doc_structure
 
     def structure(self):
         return self.fmt(self._structure)
+
+    def page(self, section, size, token=None):
+        """Return one page of a section's listing, plus a next_token for requesting the following page."""
+        return self.fmt(
+            self._serve(lambda manual: manual.section_page(section, size, token))
+        )
+
+    def stream(self, section):
+        """
+        Lazily format each record listed under a section.
+
+        Unlike structure(), this never holds the whole listing in memory, so it's the better fit for sending very large sections (say, every function) to a client incrementally. The manual counts as in use (see _serve) until the stream is exhausted or closed.
+        """
+        while True:
+            manual = self._acquire()
+            try:
+                records = manual.iter_section(section)
+                try:
+                    # only the first read can find the manual stale; see _serve
+                    first = next(records, _DONE)
+                except exceptions.StaleDatabase:
+                    if not self.build:
+                        raise
+                else:
+                    if first is not _DONE:
+                        yield self.fmt(first)
+                        yield from map(self.fmt, records)
+                    return
+            finally:
+                self._release(manual)
+            self._reload(replacing=manual)
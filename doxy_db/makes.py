@@ -142,6 +142,24 @@ class Types(Defs):
         self.defs[tuple(tupledef)] = typedef
         self.defs[name] = typedef
 
+    def for_description(self, description):
+        """Return the type for rows with a given cursor description, generating an implicit one if none is defined."""
+        try:
+            return self.defs[description]
+        except KeyError:
+            return self._implicit(description)
+
+    def dump(self, record):
+        """Return record as plain data: its field names and values (see load)."""
+        return [list(record._fields), list(record)]
+
+    def load(self, state):
+        """Rebuild a record from dump() state, as whatever type has its fields."""
+        fields, values = state
+        return self.for_description(
+            tuple((x, None, None, None, None, None, None) for x in fields)
+        )(*values)
+
     def _implicit(self, fields):
         typedef = namedtuple("_implicit", (x[0] for x in fields))
         self.defs[fields] = typedef
@@ -218,6 +236,7 @@ def default_types():
     types.define("section", ("summary", "children", "type", "root"))
     types.define("manual", ("root", "documents", "sections", "meta"))
     types.define("search", ("results",))
+    types.define("paged", ("results", "next_token"))
 
     # I want to limit noise here to types a consumer might want to leverage, so the system will implicitly create some internal-only types (like _relations and _distinct kinds) on first use.
 
@@ -260,6 +279,11 @@ def default_atoms():
     atoms.define("inherits", "compoundref", "base", "derived")
     atoms.define("reimplementing", "reimplements", "memberdef", "reimplemented")
 
+    # transitive closures; these tables are built in the sidecar on first use (see sidecar.build_closures)
+    atoms.define("all_compounds", "sidecar.closure_contains", "outer", "inner")
+    atoms.define("all_members", "sidecar.closure_member", "scope", "memberdef")
+    atoms.define("all_inherits", "sidecar.closure_compoundref", "base", "derived")
+
     return atoms
 
 
@@ -367,6 +391,14 @@ def default_relations():
     rels.define("methods", "child", "members", ("function",))
     rels.define("properties", "child", "members", ("variable",))
 
+    # Transitive rels; i.e., everything under a namespace, or every descendant of a class
+    rels.define("all_outercompounds", "parent", "all_compounds", None)
+    rels.define("all_innercompounds", "child", "all_compounds", None)
+    rels.define("all_members", "child", "all_members", None)
+    rels.define("all_compounds", "parent", "all_members", None)
+    rels.define("all_subclasses", "child", "all_inherits", None)
+    rels.define("all_superclasses", "parent", "all_inherits", None)
+
     return rels
 
 
@@ -3,27 +3,78 @@ Abstract SQL-backed doxygen manual API.
 
 It is intended to sit at a fairly high abstraction level to encapsulate most of Doxygen's higher-level idioms. It tries to strike a balance between enabling consumers to perform common tasks without significant knowledge of Doxygen's internals, and providing a toolkit for using those idioms to extend a manual's behavior as needed.
 """
+import functools
+import json
+import os
 import re
+import sqlite3
 
 from collections import namedtuple
 from pkg_resources import parse_version
 
 
-from . import db, sql, exceptions, loggle, DEFAULT_DB_URI
+from . import db, sql, views, index, sidecar, exceptions, loggle, DEFAULT_DB_URI
 
 
 SUPPORTED_SCHEMA_VERSION = parse_version("0.2.1")
 FIRST_COMPAT_DOXYGEN_VERSION = parse_version("1.8.15")
 
+# default number of ranked results from Manual.text_search and Manual.fuzzy_search
+TEXT_SEARCH_LIMIT = 20
+FUZZY_SEARCH_LIMIT = 10
+
+# bump when the snapshot format changes; see Manual.save_snapshot
+SNAPSHOT_VERSION = 2
+
 
 def default_tokenizer(search_string):
     return re.split(r"\s", search_string)
 
 
+def paginate(api, records, size, token=None):
+    """
+    Keyset-paginate already-fetched records by rowid, as views do in SQL.
+
+    Records without a rowid (i.e., sections) sort first.
+    """
+    sql.check_page_size(size)
+    after = sql.keyset_rowid(token)
+    remaining = sorted(
+        (x for x in records if not token or getattr(x, "rowid", 0) > after),
+        key=lambda x: getattr(x, "rowid", 0),
+    )
+
+    return api.types.get("paged")(
+        remaining[:size],
+        sql.keyset_token(remaining[size - 1].rowid) if len(remaining) > size else None,
+    )
+
+
 def create(uri, description=None, **kwarg):
     return Manual(uri, description, **kwarg).extend(add_manual_api)
 
 
+def load_snapshot(path, uri=DEFAULT_DB_URI, **kwarg):
+    """
+    Create a manual from a snapshot saved by Manual.save_snapshot, instead of compiling and mounting it again.
+
+    The database at uri must be the one the snapshot was taken from (its meta.generated_at must match); otherwise this raises StaleSnapshot, and the caller should build the manual the long way (and probably save a fresh snapshot). Keyword arguments go to create().
+    """
+    with open(path) as file:
+        state = json.load(file)
+
+    if state.get("version") != SNAPSHOT_VERSION:
+        raise exceptions.StaleSnapshot(
+            "Snapshot format {} is not supported (expected {})".format(
+                state.get("version"), SNAPSHOT_VERSION
+            )
+        )
+
+    man = create(uri, state["description"], **kwarg)
+    man.restore(state, **kwarg)
+    return man
+
+
 def add_manual_api(api):
     api.page_tree = api.make_compound_tree(["page"], api.relations.get("subpages"))
     api.class_doc = api.make_compound_tree(["class"], api.relations.get("methods"))
@@ -71,13 +122,16 @@ def doxygen_manual(manual):
 
 
 class Manual(db.DoxygenSQLite3):
-    root = sections = documents = description = _meta = None
+    root = sections = documents = description = names = _meta = None
+    _fetches = _rel_columns = _relation_sets = _fuzzy = _fingerprint = None
 
     def __init__(self, uri, description, tokenizer=default_tokenizer, **kwarg):
-        # section = (name, sectob, section.doc_structure())
+        # section = (name, sectob, views.Lazy(sectob.doc_structure))
         self.sections = []
         # document = namedtuple stub(...)
         self.documents = []
+        # name index over documents; see query()
+        self.names = index.NameIndex()
         self.description = description
         self.tokenizer = tokenizer
 
@@ -109,6 +163,8 @@ class Manual(db.DoxygenSQLite3):
                 )
             )
 
+        self._compile_fetch()
+
     def tokenize(self, command):
         return self.tokenizer(command)
 
@@ -132,10 +188,14 @@ class Manual(db.DoxygenSQLite3):
             or "Doxygen-generated manual"
         )
 
-    def doc_search(self, query, tokens=None):
+    def doc_search(self, query, tokens=None, ids_only=False, fuzzy=False):
         """
 
         Return formats for this are a bit of an open question.
+
+        With ids_only, matching documents are returned as bare rowids (see doc_search_lazy). A query that just names a section still returns the section's structure.
+
+        With fuzzy, a search that finds nothing returns the documents with the names closest to the unmatched term instead (see fuzzy_search), so typos still find something.
         """
 
         # Below just returns empty. This means the user's responsible for what to do after an empty search. Right format?
@@ -154,7 +214,9 @@ class Manual(db.DoxygenSQLite3):
             if target == name:  # lowercase?
                 if len(tokens):
                     target = tokens.pop(0)
-                    results = section.doc_search(target, tokens=tokens)
+                    results = section.doc_search(
+                        target, tokens=tokens, ids_only=ids_only
+                    )
                 else:
                     # TODO: is this the right format?
                     return [section.structure()]
@@ -162,20 +224,222 @@ class Manual(db.DoxygenSQLite3):
         # Otherwise, try searching my local documents for the target
         if not results or not len(results):
             results = self.query(target, self.documents)
+            if results and ids_only:
+                results = [x.rowid for x in results]
 
         # Fall back; see if <target> exists in any section
         if not results or not len(results):
-            results = []
-            for _name, section, _subsections in self.sections:
-                result = section.doc_search(target, tokens)
+            results = self._search_sections(target, tokens, ids_only=ids_only)
+
+        if fuzzy and not results:
+            results = self.fuzzy_search(target, ids_only=ids_only)
+
+        return results
+
+    def _search_sections(self, target, tokens, ids_only=False):
+        """
+        Search every section for target (drilling down through tokens), merging results in section order.
 
+        The searches of all view sections compile into a single UNION ALL of their path queries (selecting tagged rowids), and matches are hydrated as stubs with one bulk lookup; a miss costs one query no matter how many sections are mounted. Sections that are themselves manuals search on their own.
+        """
+        terms = [target, *(tokens or ())]
+        statements = {}
+        branches = []
+        for position, (_name, section, _subsections) in enumerate(self.sections):
+            if isinstance(section, views.View):
+                statement, args = section._path_search("name", terms)
+                statements[str(position)] = statement
+                branches.append(args)
+
+        found = {}
+        if statements:
+            query = self.statement_cache.get(
+                (tuple(x._full_query for x in statements.values()), None, ("union",)),
+                lambda: sql.Union(self, statements, ids_only=True),
+            )
+            for tag, rowid in query(branches=branches):
+                found.setdefault(tag, []).append(rowid)
+
+        if found and not ids_only:
+            stubs = iter(self.stubs([x for rowids in found.values() for x in rowids]))
+            found = {
+                tag: [next(stubs) for _ in rowids] for tag, rowids in found.items()
+            }
+
+        results = []
+        for position, (_name, section, _subsections) in enumerate(self.sections):
+            if str(position) in statements:
+                results.extend(found.get(str(position), ()))
+            else:
+                # copy tokens; manuals consume them
+                result = section.doc_search(
+                    target, list(tokens or ()), ids_only=ids_only
+                )
                 if result and len(result):
                     results.extend(result)
 
         return results
 
+    def fuzzy_search(self, topic, limit=FUZZY_SEARCH_LIMIT, ids_only=False):
+        """
+        Return up to limit stubs (or, with ids_only, rowids) whose names are most similar to topic, best first.
+
+        Similarity is by shared trigrams (see index.FuzzyIndex); the index covers every compound and member name, and is built on first use.
+        """
+        if self._fuzzy is None:
+            self._fuzzy = index.FuzzyIndex(
+                sql.stream(self.connection.execute("SELECT rowid, name FROM def"))
+            )
+
+        rowids = self._fuzzy.search(topic, limit)
+        return rowids if ids_only else self.stubs(rowids)
+
+    def doc_search_lazy(self, query, documents=False):
+        """
+        Id-first doc_search.
+
+        Runs the search for rowids only, and returns a views.Deferred that hydrates stubs (or full documents, with documents=True) in batches as they are consumed.
+        """
+        results = self.doc_search(query, ids_only=True)
+
+        # section hit; nothing to defer
+        if results and not isinstance(results[0], int):
+            return results
+
+        return views.Deferred(
+            results, self._fetch_documents if documents else self.stubs
+        )
+
+    def _fetch_documents(self, rowids):
+        return [self.doc_fetch(x) for x in rowids]
+
+    def doc_search_page(self, query, size, token=None):
+        """
+        Return one page (up to size records, in rowid order) of doc_search() results, plus a token for the next page.
+
+        The keyset (rowids above the token's, in order, size + 1 at a time) is pushed down into the search's statements, so a page costs about what it returns rather than the whole result set. A query that just names a section pages through the section's listing. Unlike doc_search, results are distinct.
+        """
+        sql.check_page_size(size)
+        tokens = self.tokenize(query) if query else []
+        if not tokens:
+            return self.types.get("paged")([], None)
+        return self._search_page(tokens.pop(0), tokens, size, token)
+
+    def _search_page(self, target, tokens, size, token=None):
+        """
+        Page doc_search(target, tokens) one stage at a time: a section named target, then root-level documents, then every section.
+
+        Like doc_search, the first stage that finds anything supplies every page.
+        """
+        stages = []
+        for name, section, _subsections in self.sections:
+            if target == name:
+                if not tokens:
+                    return section.page(size, token)
+                target, tokens = tokens[0], tokens[1:]
+                if isinstance(section, Manual):
+                    stages.append(
+                        functools.partial(section._search_page, target, tokens)
+                    )
+                else:
+                    stages.append(
+                        functools.partial(section._path_page, "name", [target, *tokens])
+                    )
+                break
+
+        stages.append(
+            lambda size, token: paginate(
+                self, self.query(target, self.documents) or (), size, token
+            )
+        )
+        stages.append(functools.partial(self._page_sections, target, tokens))
+
+        for stage in stages:
+            page = stage(size, token)
+            # an empty page past the first may just be past the end of this stage's results
+            if page.results or (token and stage(1, None).results):
+                return page
+        return self.types.get("paged")([], None)
+
+    def _page_sections(self, target, tokens, size, token=None):
+        """
+        Return one keyset page of the results of searching every section for target (see _search_sections).
+
+        View sections page through one UNION ALL of their path queries; nested manuals page themselves, and their pages merge in.
+        """
+        after = sql.keyset_rowid(token)
+        terms = [target, *tokens]
+        statements = {}
+        branches = []
+        found = {}
+        more = False
+        for position, (_name, section, _subsections) in enumerate(self.sections):
+            if isinstance(section, views.View):
+                statement, args = section._path_search("name", terms)
+                statements[str(position)] = statement
+                branches.append(args)
+            else:
+                page = section._search_page(target, list(tokens), size, token)
+                found.update((x.rowid, x) for x in page.results)
+                more = more or page.next_token is not None
+
+        rowids = set(found)
+        if statements:
+            query = self.statement_cache.get(
+                (tuple(x._full_query for x in statements.values()), None, ("union",)),
+                lambda: sql.Union(self, statements, ids_only=True),
+            )
+            rowids.update(x for x, in query.page(after, size + 1, branches=branches))
+
+        rowids = sorted(rowids)
+        page = rowids[:size]
+        hydrated = iter(self.stubs([x for x in page if x not in found]))
+        results = [found[x] if x in found else next(hydrated) for x in page]
+
+        return self.types.get("paged")(
+            results,
+            (
+                sql.keyset_token(page[-1])
+                if len(rowids) > size or (more and page)
+                else None
+            ),
+        )
+
+    def text_search(self, query, limit=None):
+        """
+        Full-text search of names, kinds, and descriptions; returns up to limit (default: TEXT_SEARCH_LIMIT) stubs, best matches first.
+
+        query uses FTS5 query syntax (see sidecar.match_terms to search for plain terms instead). The index is built in the sidecar on first use. An empty query (e.g., match_terms of blank text) matches nothing.
+        """
+        if not query.strip():
+            return []
+        self.sidecar.require(sidecar.qualify("fulltext"))
+        search = self.statement_cache.get(
+            ("text_search",),
+            lambda: sql.Statement(self, self._def)
+            ._select("base.*")
+            ._join(conditions="sidecar.fulltext ON fulltext.rowid=base.rowid")
+            ._where("fulltext MATCH ?")
+            ._order_by(
+                "bm25(fulltext, {})".format(", ".join(map(str, sidecar.TEXT_WEIGHTS)))
+            )
+            ._limit("?")
+            .prepare(),
+        )
+        return search(query, limit or TEXT_SEARCH_LIMIT).fetchall()
+
     def query(self, topic, within):
-        """ """
+        """
+        Return [doc] for a doc in within named topic, else every doc whose name contains topic (or None).
+
+        Searches of this manual's own documents go through its name index rather than scanning.
+        """
+        if within is self.documents:
+            if len(self.names) < len(self.documents):
+                # documents added without mount(); catch up
+                self.names.add(self.documents[len(self.names) :])
+            return self.names.query(topic) or None
+
         partial_matches = []
         for doc in within:
             # try for an exact match
@@ -186,50 +450,110 @@ class Manual(db.DoxygenSQLite3):
 
         return partial_matches or None
 
-    def doc_fetch(self, rowid):
-        # KISS for now:
-        # search compounddef for rowid
-        # search memberdef if no compounddef
-        # append relations
-
-        # Start query prep work
-        compound_cols = self.types.cols("compound")
-        compound_rel = namedtuple("compound_rel", compound_cols + ("relations",))
-
-        member_cols = self.types.cols("member")
-        member_rel = namedtuple("member_rel", member_cols + ("relations",))
-
-        compound = (
-            sql.Statement(self)
-            .table("compounddef", id="rowid", columns=compound_cols)
-            .where(rowid=None)
-            .prepare()
+    def iter_list(self):
+        """Stream this manual's root-level documents (for symmetry with views, when a manual is mounted as a section)."""
+        return iter(self.documents)
+
+    def iter_section(self, name):
+        """Stream the listing of the section mounted under name."""
+        for section_name, section, _subsections in self.sections:
+            if section_name == name:
+                return section.iter_list()
+
+        raise exceptions.InvalidUsage("No section named '{}'".format(name))
+
+    def page(self, size, token=None):
+        """Return one page of this manual's root-level documents (for symmetry with ListView, when mounted as a section)."""
+        return paginate(self, self.documents, size, token)
+
+    def section_page(self, name, size, token=None):
+        """Return one page of the listing of the section mounted under name."""
+        for section_name, section, _subsections in self.sections:
+            if section_name == name:
+                return section.page(size, token)
+
+        raise exceptions.InvalidUsage("No section named '{}'".format(name))
+
+    def _compile_fetch(self):
+        """Compile doc_fetch's statements and record types (once per manual)."""
+        # the rel view has a truthy column per relation a document has
+        self._rel_columns = tuple(
+            x[0]
+            for x in self.connection.execute("SELECT * FROM rel LIMIT 0").description
+            if x[0] != "rowid"
         )
+        # relation bitmask -> the (shared) tuple of relation names it stands for
+        self._relation_sets = {}
+
+        def fetch(table, record):
+            cols = self.types.cols(record)
+            batch = (
+                sql.Statement(self)
+                .table(table, id="rowid", columns=cols)
+                ._select(
+                    ", ".join(
+                        [
+                            *("{}.{}".format(table, x) for x in cols),
+                            *("rel.{}".format(x) for x in self._rel_columns),
+                        ]
+                    )
+                )
+                ._join(conditions="rel ON rel.rowid={}.rowid".format(table))
+            )
+            single = (
+                sql.Statement(self, batch).where("{}.rowid=?".format(table)).prepare()
+            )
+            return (
+                single,
+                batch.prepare(),
+                len(cols),
+                namedtuple(record + "_rel", cols + ("relations",)),
+            )
 
-        member = (
-            sql.Statement(self)
-            .table("memberdef", id="rowid", columns=member_cols)
-            .where(rowid=None)
-            .prepare()
-        )
+        self._fetches = (fetch("compounddef", "compound"), fetch("memberdef", "member"))
 
-        # joins rel table for relation infoz
-        rel = sql.Statement(self).table("rel", "rowid").where(rowid=None).prepare()
+    def _relations(self, flags):
+        """Return the relation names for a rel row's flags, as a tuple shared by every document with the same combination."""
+        mask = 0
+        for bit, flag in enumerate(flags):
+            if flag:
+                mask |= 1 << bit
 
-        # TODO: this probably benefits nicely from caching. A simple query against this (select count(*) from (select distinct reimplemented,reimplements,innercompounds,outercompounds,innerpages,outerpages,innerdirs,outerdirs,innerfiles,outerfiles,innerclasses,outerclasses,innernamespaces,outernamespaces,innergroups,outergroups,members,compounds,subclasses,superclasses,links_in,links_out,argument_links_in,argument_links_out,initializer_links_in,initializer_links_out from rel);) revealed that my test databases with 214 and 1834 defs had only 35 and 33 distinct relation combinations. FWIW, it might be possible to cache this on the SQL side, but since sqlite doesn't have an array type, we'd still have to intentionally convert it here.
-        relations = [
-            k for k, v in rel(rowid).fetchone()._asdict().items() if v and k != "rowid"
-        ]
-        # end query prep
+        try:
+            return self._relation_sets[mask]
+        except KeyError:
+            relations = self._relation_sets[mask] = tuple(
+                name for name, flag in zip(self._rel_columns, flags) if flag
+            )
+            return relations
 
-        found = compound(rowid).fetchone()
-        if not found:
-            found = member(rowid).fetchone()
-            found = member_rel(**found._asdict(), relations=relations)
-        else:
-            found = compound_rel(**found._asdict(), relations=relations)
+    def doc_fetch(self, rowid):
+        """
+        Fetch the full record for rowid (a compound, or failing that a member), with a tuple of the relations it has.
+
+        Each attempt is one query, joined against rel for relation info. Only a few dozen combinations of relations turn up even in large databases, so relation tuples are cached by combination.
+        """
+        for statement, _batch, width, record in self._fetches:
+            found = statement(rowid).fetchone()
+            if found:
+                return record(*found[:width], self._relations(found[width:]))
+
+    def doc_fetch_many(self, rowids):
+        """
+        Like doc_fetch, for many rowids at once; records come back in the same order, with None for any rowid that isn't a document.
+
+        Compounds are fetched in bulk first, then members for whatever is left, so the number of queries doesn't grow with the batch (beyond one per table per sql.BULK_CHUNK_SIZE rowids).
+        """
+        rowids = list(rowids)
+        found = {}
+        for _statement, batch, width, record in self._fetches:
+            missing = [x for x in dict.fromkeys(rowids) if x not in found]
+            if not missing:
+                break
+            for rowid, row in batch.bulk(missing):
+                found[rowid] = record(*row[:width], self._relations(row[width:]))
 
-        return found
+        return [found.get(x) for x in rowids]
 
     def doc_related(self, rowid, relations):
         return self.relview.related(relations, rowid)
@@ -241,7 +565,11 @@ class Manual(db.DoxygenSQLite3):
         }
 
         return self.types.get("manual")(
-            self.root, docs, [x[1].structure() for x in self.sections], self._meta
+            self.root,
+            docs,
+            # reuse each section's (memoized) listing
+            [x[1].structure(children=list(x[2])) for x in self.sections],
+            self._meta,
         )
 
     def mount(self, name, section, root=None):
@@ -255,9 +583,144 @@ class Manual(db.DoxygenSQLite3):
             section.publish(root=root or section.root or None)
 
         if name:
-            self.sections.append((name, section, section.doc_structure()))
+            # listing a section waits until something asks for it
+            self.sections.append((name, section, views.Lazy(section.doc_structure)))
         else:
             self.documents.extend(section.doc_structure())
+            self.names.add(self.documents[len(self.names) :])
+
+    def snapshot(self):
+        """
+        Return this manual's compiled state as plain (JSON-serializable) data.
+
+        Covers the meta record, root document, root-level documents, and every section: its view's compiled statements (and the sidecar builds they read) and its listing (nested manuals recurse).
+        """
+        sections = []
+        for name, section, listing in self.sections:
+            if isinstance(section, Manual):
+                sections.append([name, {"manual": section.snapshot()}, None])
+            else:
+                sections.append(
+                    [name, section.snapshot(), [self.types.dump(x) for x in listing]]
+                )
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "uri": self.uri,
+            "description": self.description,
+            "meta": self.types.dump(self._meta),
+            "root": self.root and self.types.dump(self.root),
+            "documents": [self.types.dump(x) for x in self.documents],
+            "sections": sections,
+        }
+
+    def save_snapshot(self, path):
+        """
+        Save this (published) manual to path, for load_snapshot.
+
+        Loading a snapshot skips mounting: no view construction, validation queries, or section listings, so worker processes can start without rebuilding the manual. The file is replaced atomically, so processes loading it never see a partial snapshot.
+        """
+        temp = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp, "w") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temp, path)
+
+    def restore(self, state, **kwarg):
+        """Restore a freshly-created manual from snapshot() state; keyword arguments go to create() for any nested manuals."""
+        generated_at = self._meta.generated_at
+        taken_from = self.types.load(state["meta"]).generated_at
+        # an unstamped database can't vouch for the snapshot
+        if generated_at is None or generated_at != taken_from:
+            raise exceptions.StaleSnapshot(
+                "Snapshot was taken from a different database (generated at {}, not {})".format(
+                    taken_from, generated_at
+                )
+            )
+
+        self.root = state["root"] and self.types.load(state["root"])
+        self.documents.extend(self.types.load(x) for x in state["documents"])
+        self.names.add(self.documents[len(self.names) :])
+
+        for name, section, listing in state["sections"]:
+            if "manual" in section:
+                nested = section["manual"]
+                # nested manuals on the same database follow it; others keep their own
+                uri = self.uri if nested["uri"] == state["uri"] else nested["uri"]
+                man = create(uri, nested["description"], **kwarg)
+                man.restore(nested, **kwarg)
+                self.sections.append((name, man, views.Lazy(man.doc_structure)))
+            else:
+                try:
+                    view = getattr(views, section["view"])
+                except AttributeError as e:
+                    raise exceptions.StaleSnapshot(
+                        "Snapshot has an unknown view type '{}'".format(section["view"])
+                    ) from e
+                restored = view.restore(self, section)
+                lazy = views.Lazy(restored.doc_structure)
+                lazy._items = [self.types.load(x) for x in listing]
+                self.sections.append((name, restored, lazy))
+
+    def close(self):
+        """Close this manual's connections, and those of any manuals mounted in it."""
+        for _name, section, _listing in self.sections:
+            if isinstance(section, Manual):
+                section.close()
+        super().close()
+
+    def current_generated_at(self):
+        """
+        Return meta.generated_at from the database file now at uri (None if it can't be read).
+
+        Reads through a fresh connection; this manual's own connections keep seeing whatever file they opened, so this is how to notice the database being regenerated underneath us.
+        """
+        try:
+            connection = sqlite3.connect("file:{}?mode=ro".format(self.uri), uri=True)
+        except sqlite3.Error:
+            return None
+        try:
+            return connection.execute("SELECT generated_at FROM meta").fetchone()[0]
+        except (sqlite3.Error, TypeError):
+            return None
+        finally:
+            connection.close()
+
+    def fingerprint(self):
+        """
+        Return {rowid: (identity, content)} for every compound and member in the database.
+
+        identity is the document's (refid, kind, name); content hashes its compounddef/memberdef and rel rows. Computed once per manual; see changes().
+        """
+        if self._fingerprint is not None:
+            return self._fingerprint
+
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        content = {}
+        for table in ("compounddef", "memberdef", "rel"):
+            for row in cursor.execute("SELECT rowid, * FROM {}".format(table)):
+                content[row[0]] = hash((content.get(row[0]), row[1:]))
+
+        self._fingerprint = {
+            rowid: ((refid, kind, name), content.get(rowid))
+            for rowid, refid, kind, name in cursor.execute(
+                "SELECT rowid, refid, kind, name FROM def"
+            )
+        }
+        return self._fingerprint
+
+    def changes(self, other):
+        """
+        Compare this manual's documents to other's (i.e., the same docs, regenerated).
+
+        Returns (changed, structural): the set of rowids whose records differ (or only exist in one), and whether any document was added, removed, or renamed (which can change any search's results, not just those that returned it).
+        """
+        old, new = self.fingerprint(), other.fingerprint()
+        changed = {x for x in old.keys() | new.keys() if old.get(x) != new.get(x)}
+        structural = any(
+            x not in old or x not in new or old[x][0] != new[x][0] for x in changed
+        )
+        return changed, structural
 
     def publish(self, root=None):
         # preload the root document
@@ -271,7 +734,7 @@ class Manual(db.DoxygenSQLite3):
 
 
 # TODO: document and promote this pattern. Basically, it's ideal if consumer modules don't auto-publish their manuals in their global scopes. This enables someone to import and mount their manual elsewhere. Not going to try to enforce it, of course.
-def default_doxygen_manual(uri=DEFAULT_DB_URI, root=None):
-    man = create(uri).compile(doxygen_manual)
+def default_doxygen_manual(uri=DEFAULT_DB_URI, root=None, **kwarg):
+    man = create(uri, **kwarg).compile(doxygen_manual)
     man.publish(root=root)
     return man
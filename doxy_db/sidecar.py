@@ -0,0 +1,422 @@
+"""
+A sidecar database for indexes and derived tables.
+
+The Doxygen-generated database isn't ours to modify (and may be opened read-only or immutable), but it doesn't carry indexes suited to the joins and lookups our views generate. The sidecar is a separate sqlite3 database, attached to every connection under the schema name 'sidecar', that holds anything we build from the Doxygen data.
+
+Each named build (see Sidecar.define) is built once, on demand, and recorded alongside the meta.generated_at stamp of the database it was built from. A sidecar at a path you supply is really one file per stamp (path.<hash of the stamp>), reused across processes; regenerating the Doxygen database starts a new file rather than rebuilding one that other processes (or a manual still serving the old database) may be reading, and files for older stamps are removed once nothing has them open. Otherwise (or if the database has no stamp), the sidecar lives in a temporary file for as long as the API object that owns it.
+
+Sidecars use WAL journaling, so builds (which run lazily, on whichever thread first needs them) never block readers; they keep reading the last commit until the build lands.
+
+When the Doxygen database is held in memory (see DoxygenSQLite3.in_memory), readers attach an in-memory (memdb) copy of the sidecar instead. Builds still happen in the file; each finished build is copied into memory with the backup API, which only holds readers off for the copy itself.
+"""
+
+import glob
+import hashlib
+import html
+import itertools
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import weakref
+
+from . import exceptions
+
+SCHEMA = "sidecar"
+
+# names for in-memory copies of sidecars
+_memory_names = itertools.count()
+
+# a database attached to a memdb connection (see DoxygenSQLite3.in_memory) opens through memdb unless the uri names a VFS
+_file_vfs = "win32" if os.name == "nt" else "unix"
+
+# hex digits of a stamp's hash in the names of sidecar files (see Sidecar._locate)
+STAMP_LENGTH = 12
+
+# how long (ms) a connection waits on the sidecar's locks; under WAL only concurrent builders (and checkpoints) contend
+BUSY_TIMEOUT = 60000
+
+
+# guards closure builds against cycles; real containment/inheritance trees are far shallower
+MAX_CLOSURE_DEPTH = 64
+
+# closure table -> (source table, ancestor column prefix, descendant column prefix)
+CLOSURES = {
+    "closure_contains": ("contains", "outer", "inner"),
+    "closure_compoundref": ("compoundref", "base", "derived"),
+}
+
+
+def qualify(table):
+    """Return the sidecar-qualified name of a table (as-is if it already is)."""
+    if table.startswith(SCHEMA + "."):
+        return table
+    return "{}.{}".format(SCHEMA, table)
+
+
+def build_indexes(connection, api):
+    """
+    Copy def and the relation-atom tables into the sidecar with covering indexes.
+
+    Views built with DoxygenSQLite3(indexed=True) query these copies, so relation joins and name/kind lookups become index seeks.
+    """
+    connection.execute(
+        "CREATE TABLE sidecar.def (rowid INTEGER PRIMARY KEY, refid TEXT, kind TEXT, name TEXT, summary TEXT)"
+    )
+    connection.execute(
+        "INSERT INTO sidecar.def SELECT rowid, refid, kind, name, summary FROM main.def"
+    )
+    connection.execute("CREATE INDEX sidecar.def_name ON def (name, kind)")
+    connection.execute("CREATE INDEX sidecar.def_kind ON def (kind, name)")
+
+    tables = {}
+    for name in api.atoms.names():
+        atom = api.atoms.get(name)
+        tables[atom.table] = (atom.parent_col_prefix, atom.child_col_prefix)
+
+    for table, (parent, child) in tables.items():
+        if table.startswith(SCHEMA + "."):
+            # derived tables (i.e., closures) are built indexed
+            continue
+        connection.execute(
+            "CREATE TABLE sidecar.[{table}] ({parent}_rowid INTEGER, {child}_rowid INTEGER)".format(
+                table=table, parent=parent, child=child
+            )
+        )
+        connection.execute(
+            "INSERT INTO sidecar.[{table}] SELECT {parent}_rowid, {child}_rowid FROM main.[{table}]".format(
+                table=table, parent=parent, child=child
+            )
+        )
+        for first, second in ((parent, child), (child, parent)):
+            connection.execute(
+                "CREATE INDEX sidecar.[{table}_{first}] ON [{table}] ({first}_rowid, {second}_rowid)".format(
+                    table=table, first=first, second=second
+                )
+            )
+
+
+def _index_pairs(connection, table, parent, child):
+    for first, second in ((parent, child), (child, parent)):
+        connection.execute(
+            "CREATE INDEX sidecar.[{table}_{first}] ON [{table}] ({first}_rowid, {second}_rowid, depth)".format(
+                table=table, first=first, second=second
+            )
+        )
+
+
+def build_closures(connection, api):
+    """
+    Materialize the transitive closures of the contains and compoundref tables.
+
+    Each closure table has one (ancestor, descendant, depth) row per pair of records connected by one or more hops, using the source table's column names so that relation atoms can point at it directly; depth is the length of the shortest path. closure_member extends closure_contains to the members of every contained compound, so a namespace or directory reaches all of the members underneath it.
+    """
+    for closure, (source, parent, child) in CLOSURES.items():
+        connection.execute(
+            """
+            CREATE TABLE sidecar.[{closure}] AS
+            WITH RECURSIVE pairs(ancestor, descendant, depth) AS (
+                SELECT {parent}_rowid, {child}_rowid, 1 FROM main.[{source}]
+                UNION
+                SELECT pairs.ancestor, edge.{child}_rowid, pairs.depth + 1
+                FROM pairs JOIN main.[{source}] edge ON edge.{parent}_rowid=pairs.descendant
+                WHERE pairs.depth < {limit}
+            )
+            SELECT ancestor AS {parent}_rowid, descendant AS {child}_rowid, min(depth) AS depth
+            FROM pairs GROUP BY ancestor, descendant
+            """.format(
+                closure=closure,
+                source=source,
+                parent=parent,
+                child=child,
+                limit=MAX_CLOSURE_DEPTH,
+            )
+        )
+        _index_pairs(connection, closure, parent, child)
+
+    connection.execute("""
+        CREATE TABLE sidecar.closure_member AS
+        SELECT scope_rowid, memberdef_rowid, min(depth) AS depth FROM (
+            SELECT scope_rowid, memberdef_rowid, 1 AS depth FROM main.member
+            UNION ALL
+            SELECT closure.outer_rowid, member.memberdef_rowid, closure.depth + 1
+            FROM sidecar.closure_contains closure JOIN main.member member ON member.scope_rowid=closure.inner_rowid
+        ) GROUP BY scope_rowid, memberdef_rowid
+        """)
+    _index_pairs(connection, "closure_member", "scope", "memberdef")
+
+
+def topmost_build(kinds):
+    """
+    Return the name and builder for the set of parentless compounds of kinds.
+
+    Every set lives in the sidecar's topmost table, keyed by its comma-joined kinds.
+    """
+    key = ",".join(kinds)
+    marks = ", ".join("?" * len(kinds))
+
+    def build_topmost(connection, api):
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sidecar.topmost (kinds TEXT, compound_rowid INTEGER, PRIMARY KEY (kinds, compound_rowid)) WITHOUT ROWID"
+        )
+        connection.execute(
+            "INSERT INTO sidecar.topmost SELECT ?, rowid FROM main.def WHERE kind IN ({marks}) AND rowid NOT IN (SELECT rowid FROM main.inner_outer WHERE [kind:1] IN ({marks}))".format(
+                marks=marks
+            ),
+            (key, *kinds, *kinds),
+        )
+
+    return "topmost:" + key, key, build_topmost
+
+
+# column weights for ranking full-text matches (name, kind, brief, detailed)
+TEXT_WEIGHTS = (10.0, 0.0, 4.0, 1.0)
+
+_tags = re.compile(r"<[^>]*>")
+_spaces = re.compile(r"\s+")
+
+
+def plaintext(description):
+    """Crudely reduce a Doxygen XML description to searchable text (tags dropped, entities decoded)."""
+    if not description:
+        return ""
+    return _spaces.sub(" ", html.unescape(_tags.sub(" ", description))).strip()
+
+
+def match_terms(text):
+    """
+    Turn free text into an FTS5 query matching documents that contain every term (as a prefix).
+
+    Terms are quoted, so users don't need to know (or escape) FTS5 query syntax.
+    """
+    return " ".join('"{}"*'.format(x.replace('"', '""')) for x in text.split())
+
+
+def build_text(connection, api, translate=plaintext):
+    """
+    Build an FTS5 index of every compound and member's name, kind, and brief/detailed descriptions.
+
+    Descriptions are XML; translate (a callable taking and returning a string) turns them into the text that gets indexed. To index something other than plaintext(), redefine the build before first use, i.e.: api.sidecar.define("text", functools.partial(build_text, translate=...), tables=["sidecar.fulltext"])
+    """
+    connection.execute(
+        "CREATE VIRTUAL TABLE sidecar.fulltext USING fts5(name, kind, brief, detailed)"
+    )
+    for table in ("compounddef", "memberdef"):
+        rows = connection.execute(
+            "SELECT rowid, name, kind, briefdescription, detaileddescription FROM main.{}".format(
+                table
+            )
+        )
+        connection.executemany(
+            "INSERT INTO sidecar.fulltext (rowid, name, kind, brief, detailed) VALUES (?, ?, ?, ?, ?)",
+            (
+                (rowid, name, kind, translate(brief), translate(detailed))
+                for rowid, name, kind, brief, detailed in rows
+            ),
+        )
+
+
+class Sidecar(object):
+    """
+    Manage the sidecar database for one DoxygenSQLite3 object.
+
+    Reader connections just attach it (see attach); builds go through a private writer connection, so they work even when the API's own connections are read-only.
+    """
+
+    api = path = uri = generated_at = builders = tables = None
+    _writer = _lock = _locating = _built = _cleanup = _memory = _memory_uri = None
+
+    def __init__(self, api, path=None):
+        self.api = api
+        self.path = path
+        # the file depends on the database's stamp; see _locate
+        self._locating = threading.Lock()
+
+        if api.in_memory:
+            self._memory_uri = "file:/doxy_db_sidecar_{}?vfs=memdb".format(
+                next(_memory_names)
+            )
+            # keeps the in-memory copy alive, and receives each build (see _publish)
+            self._memory = sqlite3.connect(
+                self._memory_uri, uri=True, check_same_thread=False
+            )
+
+        self.builders = {}
+        # qualified table name -> the build that creates it
+        self.tables = {}
+        self._lock = threading.Lock()
+        self._built = set()
+
+        # its relation copies follow the API's atoms, but nothing reads them without the def copy
+        self.define("indexes", build_indexes, tables=[qualify("def")])
+        self.define("text", build_text, tables=[qualify("fulltext")])
+        self.define(
+            "closures",
+            build_closures,
+            tables=[qualify(x) for x in (*CLOSURES, "closure_member")],
+        )
+
+    def define(self, name, build, tables=()):
+        """
+        Register build(connection, api) as the builder for name.
+
+        tables lists the (qualified) tables the build creates, so that require() can build them on first use.
+        """
+        self.builders[name] = build
+        for table in tables:
+            self.tables[table] = name
+
+    def require(self, table):
+        """Make sure table exists, if it's one that a sidecar build provides."""
+        name = self.tables.get(table)
+        if name:
+            self.ensure(name)
+
+    def restore(self, names):
+        """Ensure each of names (i.e., the builds a snapshotted view reads), redefining any topmost builds."""
+        for name in names:
+            if name not in self.builders and name.startswith("topmost:"):
+                name, _key, build = topmost_build(name[len("topmost:") :].split(","))
+                self.define(name, build)
+            self.ensure(name)
+
+    def attach(self, connection, writer=False):
+        """Attach the sidecar to connection; readers of an in-memory database get the in-memory copy, writers always get the file."""
+        uri = self._memory_uri
+        if writer or not uri:
+            uri = self._locate(connection)
+        connection.execute("PRAGMA busy_timeout = {:d};".format(BUSY_TIMEOUT))
+        connection.execute("ATTACH DATABASE ? AS {}".format(SCHEMA), (uri,))
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._memory:
+            self._memory.close()
+        if self._cleanup:
+            self._cleanup()
+
+    def _locate(self, connection):
+        """Return the uri of the sidecar for the database connection reads, choosing it (by the database's stamp) on first use."""
+        with self._locating:
+            if self.uri:
+                return self.uri
+
+            try:
+                generated_at = connection.execute(
+                    "SELECT generated_at FROM main.meta"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                generated_at = None
+            self.generated_at = generated_at and generated_at[0]
+
+            if self.path and self.generated_at is not None:
+                digest = hashlib.sha1(str(self.generated_at).encode()).hexdigest()
+                path = "{}.{}".format(self.path, digest[:STAMP_LENGTH])
+                self._sweep(path)
+            else:
+                # an unstamped database can't vouch for a sidecar built from it, so it gets a fresh one
+                scratch = tempfile.mkdtemp(prefix="doxy_db_sidecar_")
+                self._cleanup = weakref.finalize(self, shutil.rmtree, scratch, True)
+                path = os.path.join(scratch, "sidecar.db")
+
+            self.uri = "file:{}?mode=rwc&vfs={}".format(path, _file_vfs)
+            return self.uri
+
+    def _sweep(self, keep):
+        """
+        Remove sidecar files for other stamps of the database at path, unless something still has them open.
+
+        A WAL database can only leave WAL mode once no other connection has it open, so that's our test for whether another process (or manual) still reads a file.
+        """
+        for path in glob.glob("{}.{}".format(self.path, "[0-9a-f]" * STAMP_LENGTH)):
+            if path == keep:
+                continue
+            try:
+                connection = sqlite3.connect(path, timeout=0)
+                try:
+                    mode = connection.execute("PRAGMA journal_mode = DELETE;")
+                    unused = mode.fetchone()[0] == "delete"
+                finally:
+                    connection.close()
+                if unused:
+                    os.remove(path)
+            except (sqlite3.Error, OSError):
+                continue
+
+    def _connect(self):
+        writer = self.api._connect(query_only=False, sidecar_writer=True)
+        # raw rows; builders don't need the API's record types
+        writer.row_factory = None
+        writer.isolation_level = None
+        writer.execute("PRAGMA sidecar.journal_mode = WAL;")
+        return writer
+
+    def _publish(self, writer):
+        """
+        Copy the sidecar file into the in-memory copy, if there is one.
+
+        A backup of a WAL database marks the copy as WAL too, which memdb can't open; VACUUM INTO writes a rollback-journal copy, so it stages the backup.
+        """
+        if not self._memory:
+            return
+        uri = "file:/doxy_db_sidecar_{}?vfs=memdb".format(next(_memory_names))
+        staged = sqlite3.connect(uri, uri=True)
+        try:
+            writer.execute("VACUUM {} INTO ?".format(SCHEMA), (uri,))
+            staged.backup(self._memory)
+        finally:
+            staged.close()
+
+    @staticmethod
+    def _begin(writer):
+        """
+        Start a transaction holding the sidecar's write lock (and only the sidecar's).
+
+        BEGIN IMMEDIATE would also reserve the Doxygen database, and then couldn't commit while any other connection is reading it; a no-op write takes the lock on just the sidecar, so concurrent builders (i.e., other processes sharing a sidecar file) still wait their turn.
+        """
+        writer.execute("BEGIN")
+        writer.execute(
+            "CREATE TABLE IF NOT EXISTS sidecar.builds (name TEXT PRIMARY KEY, generated_at TEXT)"
+        )
+        writer.execute("DELETE FROM sidecar.builds WHERE 0")
+
+    def ensure(self, name):
+        """Build name in the sidecar, unless it's already there for this Doxygen database."""
+        if name in self._built:
+            return
+
+        try:
+            build = self.builders[name]
+        except KeyError as e:
+            raise exceptions.InvalidUsage(
+                "No sidecar build named '{}'".format(name)
+            ) from e
+
+        with self._lock:
+            if name in self._built:
+                return
+            if self._writer is None:
+                self._writer = self._connect()
+
+            writer = self._writer
+            self._begin(writer)
+            try:
+                if not writer.execute(
+                    "SELECT 1 FROM sidecar.builds WHERE name=?", (name,)
+                ).fetchone():
+                    build(writer, self.api)
+                    writer.execute(
+                        "INSERT INTO sidecar.builds (name, generated_at) VALUES (?, ?)",
+                        (name, self.generated_at),
+                    )
+                writer.execute("COMMIT")
+            except BaseException:
+                writer.execute("ROLLBACK")
+                raise
+
+            self._publish(writer)
+            self._built.add(name)
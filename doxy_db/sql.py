@@ -1,6 +1,9 @@
-import copy
+import base64
+import binascii
 import sqlite3
 
+from collections.abc import Mapping
+
 from . import exceptions
 
 
@@ -9,60 +12,176 @@ class Silent(dict):
         return ""
 
 
+class Clauses(Mapping):
+    """
+    Immutable, structurally-shared statement clauses.
+
+    A Statement that extends another just shares its base's Clauses; "modifying" a statement swaps in a new Clauses with one entry replaced (the clause strings themselves are shared, never copied). Since a Clauses never changes, its rendered SQL is memoized.
+    """
+
+    __slots__ = ("_clauses", "_rendered")
+
+    def __init__(self, clauses):
+        self._clauses = clauses
+        self._rendered = {}
+
+    def __getitem__(self, key):
+        return self._clauses[key]
+
+    def __iter__(self):
+        return iter(self._clauses)
+
+    def __len__(self):
+        return len(self._clauses)
+
+    def set(self, key, value):
+        """Return a copy of these clauses with key set to value."""
+        clauses = dict(self._clauses)
+        clauses[key] = value
+        return Clauses(clauses)
+
+    def render(self, template, **override):
+        """Render template from these clauses (plus overrides), memoizing the result."""
+        key = (template, *sorted(override.items()))
+        try:
+            return self._rendered[key]
+        except KeyError:
+            rendered = self._rendered[key] = template.format_map(
+                Silent(self._clauses, **override)
+            )
+            return rendered
+
+
+# rows per fetchmany() when streaming results
+FETCH_SIZE = 256
+
+
+def stream(cursor, size=FETCH_SIZE):
+    """Yield rows from cursor, fetching them in chunks of size to keep memory bounded."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def keyset_token(rowid):
+    """Encode the last rowid of a page as an opaque continuation token."""
+    return base64.urlsafe_b64encode(str(rowid).encode()).decode()
+
+
+def keyset_rowid(token):
+    """Decode a continuation token from keyset_token(); no token means 'start at the top'."""
+    if not token:
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, ValueError) as e:
+        raise exceptions.InvalidUsage("Invalid page token: {}".format(token)) from e
+
+
+def check_page_size(size):
+    """Raise InvalidUsage unless size is a usable page size (a positive integer)."""
+    if isinstance(size, bool) or not isinstance(size, int) or size < 1:
+        raise exceptions.InvalidUsage(
+            "Page size must be a positive integer, not {!r}".format(size)
+        )
+
+
 def quote(string):
     if string is None:
         return "?"
     return "'{}'".format(string)
 
 
+class StatementCache(object):
+    """
+    Cache prepared statements by a caller-specified key.
+
+    Building a statement means copying clauses, rendering the template, and freezing the result; for searches that are run repeatedly this setup can easily cost more than the query itself. The hits/misses counters are there to make it easy to see whether the cache is earning its keep.
+    """
+
+    hits = misses = 0
+    statements = None
+
+    def __init__(self):
+        self.statements = {}
+
+    def __len__(self):
+        return len(self.statements)
+
+    def get(self, key, build):
+        """Return the statement cached under key, calling build() to prepare it on a miss."""
+        try:
+            statement = self.statements[key]
+        except KeyError:
+            self.misses += 1
+            statement = self.statements[key] = build()
+        else:
+            self.hits += 1
+        return statement
+
+    def clear(self):
+        self.statements.clear()
+        self.hits = self.misses = 0
+
+
 class Statement(object):
-    template = "{select}{from}{join}{where}{group_by}{order_by}{limit}"
+    template = "{with}{select}{from}{join}{where}{group_by}{order_by}{limit}"
     clauses = None
-    _full_query = None
-    _ids_only = None
+    _frozen = False
 
     def __init__(self, api, base=None):
         self.api = api
         if base:
-            self.clauses = copy.deepcopy(base.clauses)
+            # copy-on-write; we only replace our clauses when we modify them
+            self.clauses = base.clauses
         else:
-            self.clauses = {"columns": "*"}
+            self.clauses = Clauses({"columns": "*"})
 
-    def _select(self, clause):
-        self.clauses["select"] = "SELECT {}".format(clause)
+    def _set(self, key, value):
+        if self._frozen:
+            raise exceptions.FrozenStatement(FROZEN_MESSAGE)
+        self.clauses = self.clauses.set(key, value)
         return self
 
+    def _with(self, clause):
+        return self._set("with", "WITH {} ".format(clause))
+
+    def _select(self, clause):
+        return self._set("select", "SELECT {}".format(clause))
+
     def _from(self, clause):
-        self.clauses["from"] = " FROM {}".format(clause)
-        return self
+        return self._set("from", " FROM {}".format(clause))
 
     def _join(self, kind=None, conditions=None):
         if kind is None:
-            self.clauses["join"] = " JOIN {}".format(conditions)
+            self._set("join", " JOIN {}".format(conditions))
         # TODO: untested, unused; disabled for now
         # else:
-        #     self.clauses["join"] = " {} JOIN {}".format(kind, conditions)
+        #     self._set("join", " {} JOIN {}".format(kind, conditions))
         return self
 
     def _where(self, clause):
-        self.clauses["where"] = " WHERE {}".format(clause)
-        return self
+        return self._set("where", " WHERE {}".format(clause))
 
     # TODO: untested, unused; disabling until needed
     # def _group_by(self, clause):
-    #     self.clauses["group_by"] = " GROUP BY {}".format(clause)
-    #     return self
+    #     return self._set("group_by", " GROUP BY {}".format(clause))
 
     def _order_by(self, clause):
-        self.clauses["order_by"] = " ORDER BY {}".format(clause)
-        return self
+        return self._set("order_by", " ORDER BY {}".format(clause))
 
     def order_by(self, col, reverse=False):
         return self._order_by("{}{}".format(col, " DESC" if reverse else ""))
 
+    def _id(self, column):
+        """Override the id column set by .table() (i.e., when the table is aliased)."""
+        self._set("id", "SELECT {}".format(column))
+        return self._set("key", column)
+
     def _limit(self, clause):
-        self.clauses["limit"] = " LIMIT {}".format(clause)
-        return self
+        return self._set("limit", " LIMIT {}".format(clause))
 
     def limit(self, num):
         return self._limit(str(num))
@@ -71,13 +190,15 @@ class Statement(object):
         if columns is None:
             columns = []
 
-        self.clauses["table"] = name
+        self._set("table", name)
         table_col = "{}.{}".format(name, "{}")
-        self.clauses["columns"] = [table_col.format(x) for x in columns]
+        self._set("columns", tuple(table_col.format(x) for x in columns))
 
         if id:
             # also generate an ID-only version
-            self.clauses["id"] = "SELECT {}.{}".format(name, id)
+            self._set("id", "SELECT {}.{}".format(name, id))
+            # and remember the key column for bulk lookups
+            self._set("key", "{}.{}".format(name, id))
 
         fmt = name + ".{}"
         self._select(
@@ -102,12 +223,15 @@ class Statement(object):
         """
 
         if "where" in self.clauses:
-            self.clauses["where"] = " AND ".join(
-                [
-                    self.clauses["where"],
-                    *arg,
-                    *["{}={}".format(k, quote(v)) for k, v in kwarg.items()],
-                ]
+            self._set(
+                "where",
+                " AND ".join(
+                    [
+                        self.clauses["where"],
+                        *arg,
+                        *["{}={}".format(k, quote(v)) for k, v in kwarg.items()],
+                    ]
+                ),
             )
         else:
             self._where(
@@ -124,40 +248,179 @@ class Statement(object):
                 "Set a table name and id via .table() before calling prepare."
             )
 
-        self._full_query = self.template.format_map(Silent(self.clauses))
-        self._ids_only = self.template.format_map(
-            Silent(self.clauses, select=self.clauses["id"])
+        self._frozen = True
+
+        return PreparedStatement(
+            self.api,
+            self.clauses,
+            self.clauses.render(self.template),
+            self.clauses.render(self.template, select=self.clauses["id"]),
         )
 
-        self._freeze()
 
-        return self
+# stay well under SQLITE_MAX_VARIABLE_NUMBER (999 on older sqlite builds)
+BULK_CHUNK_SIZE = 512
 
-    def _freeze(self):
-        def frozen(*arg, **kwarg):
-            raise exceptions.FrozenStatement(
-                "To limit (but not eliminate) the risk of SQL injection, Statement objects are frozen when prepare() is called."
-            )
+FROZEN_MESSAGE = "To limit (but not eliminate) the risk of SQL injection, Statement objects are frozen when prepare() is called."
+
+
+class PreparedStatement(object):
+    """
+    A compiled statement, as returned by Statement.prepare().
+
+    Holds just what it needs to execute (the api and the two rendered queries), plus the shared clauses so that new Statements can extend it. Builder methods are unavailable, in keeping with the freeze-on-prepare policy.
+    """
+
+    __slots__ = ("api", "clauses", "_full_query", "_ids_only")
+    template = Statement.template
+
+    def __init__(self, api, clauses, full_query, ids_only):
+        self.api = api
+        self.clauses = clauses
+        self._full_query = full_query
+        self._ids_only = ids_only
 
-        for prop in dir(self):
-            if not prop.startswith("__") and callable(getattr(self, prop)):
-                setattr(self, prop, frozen)
+    def __getattr__(self, name):
+        # only reached on a miss, so it costs nothing on the execute path
+        if hasattr(Statement, name):
+            raise exceptions.FrozenStatement(FROZEN_MESSAGE)
+        raise AttributeError(name)
 
     def __call__(self, *args, ids_only=False):
+        query = self._ids_only if ids_only else self._full_query
         try:
-            return self.api.connection.execute(
-                self._ids_only if ids_only else self._full_query, tuple(args)
-            )
+            return self.api.connection.execute(query, args)
         except sqlite3.OperationalError as e:
-            raise exceptions.MalformedQuery(
-                "Malformed query",
-                self._ids_only if ids_only else self._full_query,
-                tuple(args),
-            ) from e
+            raise exceptions.MalformedQuery("Malformed query", query, args) from e
         except sqlite3.ProgrammingError as e:
             # Note: there may be more conditions that can raise this; it may need a broader message and exception type.
             raise exceptions.StatementArgumentMismatch(
-                "Unexpected argument quantity",
-                self._ids_only if ids_only else self._full_query,
-                tuple(args),
+                "Unexpected argument quantity", query, args
+            ) from e
+
+    def dump(self):
+        """Return this statement's clauses and rendered queries as plain data (see load)."""
+        return [dict(self.clauses), self._full_query, self._ids_only]
+
+    @classmethod
+    def load(cls, api, state):
+        """Rebuild a statement from dump() state, without re-rendering it."""
+        clauses, full_query, ids_only = state
+        return cls(api, Clauses(clauses), full_query, ids_only)
+
+    def _bulk_query(self, count):
+        """Render this statement restricted to `count` values of its key column."""
+        restriction = "{} IN ({})".format(self.clauses["key"], ", ".join("?" * count))
+        if "where" in self.clauses:
+            where = " AND ".join([self.clauses["where"], restriction])
+        else:
+            where = " WHERE {}".format(restriction)
+        return self.clauses.render(self.template, where=where)
+
+    def bulk(self, keys, *args):
+        """
+        Look up many keys in as few queries as possible.
+
+        Restricts this statement to rows whose key column (set via .table()) is IN a chunk of keys, and yields (key, row) pairs. Any args are bound ahead of the keys (i.e., they fill placeholders already in the where clause). Rows must include the key column so that they can be tagged; order follows the database, not keys.
+
+        Short chunks are padded (by repeating a key) to a power of two, so the number of distinct queries sqlite has to compile stays small.
+        """
+        if "key" not in self.clauses:
+            raise exceptions.IncompleteStatement(
+                "Set a table name and id via .table() before calling bulk."
+            )
+
+        keys = list(keys)
+        column = self.clauses["key"].rsplit(".", 1)[-1].strip("[]")
+        index = None
+
+        for start in range(0, len(keys), BULK_CHUNK_SIZE):
+            chunk = keys[start : start + BULK_CHUNK_SIZE]
+            size = 1
+            while size < len(chunk):
+                size *= 2
+            chunk.extend(chunk[-1:] * (size - len(chunk)))
+
+            query = self._bulk_query(size)
+            try:
+                cursor = self.api.connection.execute(query, (*args, *chunk))
+            except sqlite3.OperationalError as e:
+                raise exceptions.MalformedQuery("Malformed query", query, args) from e
+            except sqlite3.ProgrammingError as e:
+                raise exceptions.StatementArgumentMismatch(
+                    "Unexpected argument quantity", query, args
+                ) from e
+
+            if index is None:
+                try:
+                    index = [x[0] for x in cursor.description].index(column)
+                except ValueError:
+                    raise exceptions.IncompleteStatement(
+                        "Bulk lookups must select their key column ({}).".format(column)
+                    )
+
+            for row in cursor:
+                yield row[index], row
+
+
+class Union(object):
+    """
+    Several prepared statements, run as a single UNION ALL query.
+
+    Each branch selects a leading column tagging its rows with the branch's name (so statements must select compatible columns). With ids_only, branches select just their key column (as rowid), which any statements can share, and the union can be paged (see page). Rows come back as plain tuples; callers split them by tag (see View.related).
+    """
+
+    __slots__ = ("api", "tags", "_query")
+
+    def __init__(self, api, statements, ids_only=False):
+        self.api = api
+        self.tags = tuple(statements)
+        self._query = " UNION ALL ".join(
+            x.clauses.render(
+                x.template,
+                select="SELECT {} AS tag, {}".format(
+                    quote(tag),
+                    (
+                        "{} AS rowid".format(x.clauses["key"])
+                        if ids_only
+                        else x.clauses["select"][len("SELECT ") :]
+                    ),
+                ),
+            )
+            for tag, x in statements.items()
+        )
+
+    def __call__(self, *args, branches=None):
+        """Run the query, binding args to every branch, or (if given) each of branches' args to its branch."""
+        return self._execute(self._query, self._args(args, branches))
+
+    def page(self, after, size, *args, branches=None):
+        """
+        Run an ids_only union for one keyset page: up to size distinct rowids greater than after, in order.
+
+        Bind args or branches as for calling the union.
+        """
+        return self._execute(
+            "SELECT DISTINCT rowid FROM ({}) WHERE rowid>? ORDER BY rowid LIMIT ?".format(
+                self._query
+            ),
+            (*self._args(args, branches), after, size),
+        )
+
+    def _args(self, args, branches):
+        if branches is None:
+            return args * len(self.tags)
+        return tuple(x for branch in branches for x in branch)
+
+    def _execute(self, query, args):
+        cursor = self.api.connection.cursor()
+        # skip building a type for the tagged rows; they get rebuilt untagged
+        cursor.row_factory = None
+        try:
+            return cursor.execute(query, args)
+        except sqlite3.OperationalError as e:
+            raise exceptions.MalformedQuery("Malformed query", query, args) from e
+        except sqlite3.ProgrammingError as e:
+            raise exceptions.StatementArgumentMismatch(
+                "Unexpected argument quantity", query, args
             ) from e
@@ -5,7 +5,13 @@ I prefer doing as little work here as possible; hopefully just testing how we ha
 """
 
 import unittest
+import shutil
 import sqlite3
+import tempfile
+import threading
+import os
+
+from concurrent.futures import ThreadPoolExecutor
 
 from .. import db as doxygen_db
 from .. import exceptions
@@ -33,6 +39,23 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(exceptions.StatementArgumentMismatch):
             statement("one", "two")
 
+    def test_bulk(self):
+        statement = sql.Statement(db).table("def", "rowid").prepare()
+        rowids = [x.rowid for x in db.connection.execute("select rowid from def")]
+
+        found = dict(statement.bulk(rowids))
+        self.assertEqual(set(found), set(rowids))
+        self.assertTrue(all(found[rowid].rowid == rowid for rowid in rowids))
+
+        # rows have to carry their key to be tagged
+        with self.assertRaises(exceptions.IncompleteStatement):
+            list(
+                sql.Statement(db)
+                .table("def", "rowid", columns=["name"])
+                .prepare()
+                .bulk(rowids)
+            )
+
     def test_decodability(self):
         """
         Common string gotchas in C++ can lead to junk data in the database. One sign of junk data like this is a UTF-8 decode error from sqlite3, but this only helps us if we actually force the dbapi to load the bad data. Here's a sample error:
@@ -89,6 +112,242 @@ class TestDatabase(unittest.TestCase):
                         )
                     )
 
+    def test_read_only(self):
+        ro = doxygen_db.DoxygenSQLite3(TEST_DB, read_only=True, mmap_size=1024 * 1024)
+
+        self.assertEqual(
+            ro.connection.execute("PRAGMA mmap_size;").fetchone()[0], 1024 * 1024
+        )
+        self.assertEqual(
+            ro.connection.execute("select count(*) as total from def").fetchone(),
+            db.connection.execute("select count(*) as total from def").fetchone(),
+        )
+
+        with self.assertRaises(sqlite3.OperationalError):
+            ro.connection.execute("create table scratch (id)")
+
+    def test_thread_connections(self):
+        statement = sql.Statement(db).table("def", "rowid").where(rowid=None).prepare()
+        rowids = [x.rowid for x in db.connection.execute("select rowid from def")]
+
+        def lookup(rowid):
+            return id(db.connection), statement(rowid).fetchone()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lookup, rowids))
+
+        self.assertEqual([x[1].rowid for x in results], rowids)
+        self.assertNotIn(id(db.connection), {x[0] for x in results})
+
+    def test_in_memory(self):
+        expected = db.connection.execute("select * from def order by rowid").fetchall()
+
+        for in_memory in (True, doxygen_db.VIEW_TABLES):
+            mem = doxygen_db.DoxygenSQLite3(TEST_DB, in_memory=in_memory)
+            self.assertEqual(
+                mem.connection.execute("select * from def order by rowid").fetchall(),
+                expected,
+            )
+            # not backed by files (the sidecar included)
+            for database in mem.connection.execute("PRAGMA database_list"):
+                self.assertFalse(os.path.exists(database.file))
+
+        # sidecar builds land in memory, too
+        self.assertEqual(
+            mem.topmost(["struct"], "structs").list(),
+            db.topmost(["struct"], "structs").list(),
+        )
+
+        # tables outside the preload set aren't copied
+        with self.assertRaises(sqlite3.OperationalError):
+            mem.connection.execute("select * from param")
+
+        # other threads read the same copy while this one is mid-query
+        cursor = mem.connection.execute("select rowid from def order by rowid")
+        cursor.fetchone()
+
+        def count(_):
+            return mem.connection.execute(
+                "select count(*) as total from def"
+            ).fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            self.assertEqual(set(pool.map(count, range(2))), {len(expected)})
+
+    def test_indexed(self):
+        indexed = doxygen_db.DoxygenSQLite3(TEST_DB, indexed=True)
+        self.assertEqual(indexed.def_table, "sidecar.def")
+
+        relations = ["members", "compounds", "innercompounds", "subclasses", "links_in"]
+        for row in db.connection.execute("select rowid from def"):
+            expected = db.relview.related(relations, row.rowid)
+            found = indexed.relview.related(relations, row.rowid)
+            for name in relations:
+                self.assertEqual(sorted(found[name]), sorted(expected[name]))
+
+    def test_sidecar_reuse(self):
+        with tempfile.TemporaryDirectory() as scratch:
+            path = os.path.join(scratch, "sidecar.db")
+            doxygen_db.DoxygenSQLite3(TEST_DB, sidecar_path=path, indexed=True).close()
+
+            reopened = doxygen_db.DoxygenSQLite3(TEST_DB, sidecar_path=path)
+            builds = reopened.connection.execute(
+                "select name, generated_at from sidecar.builds"
+            ).fetchall()
+            self.assertEqual([x.name for x in builds], ["indexes"])
+            self.assertEqual(
+                builds[0].generated_at,
+                db.connection.execute("select generated_at from meta").fetchone()[0],
+            )
+            reopened.close()
+
+    def test_sidecar_regenerated(self):
+        with tempfile.TemporaryDirectory() as scratch:
+            path = os.path.join(scratch, "doxygen_sqlite3.db")
+            shutil.copy(TEST_DB, path)
+            sidecar_path = os.path.join(scratch, "sidecar.db")
+            old = doxygen_db.DoxygenSQLite3(
+                path, sidecar_path=sidecar_path, indexed=True
+            )
+            count = "select count(*) as total from sidecar.def"
+            expected = old.connection.execute(count).fetchone().total
+
+            regenerated = os.path.join(scratch, "regenerated.db")
+            shutil.copy(path, regenerated)
+            connection = sqlite3.connect(regenerated)
+            connection.execute("UPDATE meta SET generated_at='later'")
+            connection.commit()
+            connection.close()
+            os.replace(regenerated, path)
+
+            # the new database gets its own sidecar; the old one keeps reading (and keeps) its own
+            new = doxygen_db.DoxygenSQLite3(
+                path, sidecar_path=sidecar_path, indexed=True
+            )
+            self.assertEqual(new.connection.execute(count).fetchone().total, expected)
+            self.assertEqual(old.connection.execute(count).fetchone().total, expected)
+
+            def sidecars():
+                return {
+                    x
+                    for x in os.listdir(scratch)
+                    if x.startswith("sidecar.db.") and "-" not in x
+                }
+
+            both = sidecars()
+            self.assertEqual(len(both), 2)
+
+            # once nothing reads it, the next API to start up removes it
+            old.close()
+            doxygen_db.DoxygenSQLite3(path, sidecar_path=sidecar_path).close()
+            self.assertEqual(len(sidecars()), 1)
+            self.assertLess(sidecars(), both)
+            new.close()
+
+    def test_read_during_build(self):
+        for in_memory in (False, True):
+            with self.subTest(in_memory=in_memory):
+                self._read_during_build(in_memory)
+
+    def _read_during_build(self, in_memory):
+        api = doxygen_db.DoxygenSQLite3(TEST_DB, indexed=True, in_memory=in_memory)
+        started, release = threading.Event(), threading.Event()
+
+        def slow(connection, _api):
+            connection.execute("create table sidecar.slow (id)")
+            connection.execute("insert into sidecar.slow select rowid from main.def")
+            started.set()
+            release.wait(10)
+
+        api.sidecar.define("slow", slow)
+        builder = threading.Thread(target=api.sidecar.ensure, args=("slow",))
+        builder.start()
+        self.assertTrue(started.wait(10))
+
+        def count(_):
+            return api.connection.execute(
+                "select count(*) as total from sidecar.def"
+            ).fetchone()[0]
+
+        try:
+            # readers on existing and brand-new connections see the last commit
+            expected = count(None)
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                self.assertEqual(set(pool.map(count, range(2))), {expected})
+        finally:
+            release.set()
+            builder.join()
+
+        self.assertEqual(
+            api.connection.execute("select count(*) as total from sidecar.slow")
+            .fetchone()
+            .total,
+            expected,
+        )
+        api.close()
+
+    def test_closures(self):
+        def reachable(rowid, relation):
+            found = {}
+            frontier = [rowid]
+            while frontier:
+                rows = [
+                    x
+                    for y in frontier
+                    for x in db.relview.related([relation], y)[relation]
+                ]
+                frontier = [x.rowid for x in rows if x.rowid not in found]
+                found.update((x.rowid, x) for x in rows)
+            return sorted(found)
+
+        for row in db.connection.execute("select rowid from def"):
+            for closure, relation in (
+                ("all_subclasses", "subclasses"),
+                ("all_superclasses", "superclasses"),
+                ("all_innercompounds", "innercompounds"),
+                ("all_outercompounds", "outercompounds"),
+            ):
+                self.assertEqual(
+                    sorted(
+                        x.rowid
+                        for x in db.relview.related([closure], row.rowid)[closure]
+                    ),
+                    reachable(row.rowid, relation),
+                )
+
+            members = {
+                x.rowid
+                for y in [row.rowid, *reachable(row.rowid, "innercompounds")]
+                for x in db.relview.related(["members"], y)["members"]
+            }
+            self.assertEqual(
+                {
+                    x.rowid
+                    for x in db.relview.related(["all_members"], row.rowid)[
+                        "all_members"
+                    ]
+                },
+                members,
+            )
+
+    def test_topmost(self):
+        for kinds in (["page"], ["class", "struct"], ["dir", "file"]):
+            anti_join = db.connection.execute(
+                "select rowid from def where kind in ('{kinds}') and rowid not in (select rowid from inner_outer where [kind:1] in ('{kinds}'))".format(
+                    kinds="','".join(kinds)
+                )
+            )
+            try:
+                found = db.topmost(kinds, "topmost").list()
+            except exceptions.IncompatibleBaseQuery:
+                found = []
+            self.assertEqual(
+                sorted(x.rowid for x in found), sorted(x.rowid for x in anti_join)
+            )
+
+        builds = db.connection.execute("select name from sidecar.builds").fetchall()
+        self.assertIn("topmost:class,struct", [x.name for x in builds])
+
 
 class TestTypes(unittest.TestCase):
     """Test the typedef API."""
@@ -0,0 +1,61 @@
+import unittest
+
+from collections import namedtuple
+
+from .. import index
+
+doc = namedtuple("doc", ("rowid", "name"))
+
+names = ["Vehicle", "vehicleStart", "vehicleStop", "Car", "Truck", "Car", "a", ""]
+docs = [doc(rowid, name) for rowid, name in enumerate(names)]
+
+
+def scan(topic):
+    """The linear search the index replaces."""
+    partial = []
+    for x in docs:
+        if x.name == topic:
+            return [x]
+        elif x.name.find(topic) > -1:
+            partial.append(x)
+    return partial
+
+
+class TestNameIndex(unittest.TestCase):
+    def test_matches_scan(self):
+        lookup = index.NameIndex(docs)
+        for topic in [
+            "Vehicle",
+            "ehicle",
+            "vehicleSt",
+            "hicleS",
+            "Car",
+            "ar",
+            "a",
+            "r",
+            "",
+            "Truckload",
+            "zzz",
+        ]:
+            self.assertEqual(lookup.query(topic), scan(topic), topic)
+
+    def test_incremental(self):
+        names = index.NameIndex(docs[:3])
+        self.assertEqual(names.query("Car"), [])
+
+        names.add(docs[3:])
+        self.assertEqual(len(names), len(docs))
+        # the first exact match wins
+        self.assertIs(names.query("Car")[0], docs[3])
+        self.assertEqual(names.partial("ruc"), [docs[4]])
+
+
+class TestFuzzyIndex(unittest.TestCase):
+    def test_closest_first(self):
+        fuzzy = index.FuzzyIndex((x.rowid, x.name) for x in docs)
+
+        self.assertEqual(fuzzy.search("vehicelStart", 1), [1])
+        self.assertEqual(set(fuzzy.search("vehicel", 3)), {0, 1, 2})
+        # records sharing a name share a rank
+        self.assertEqual(fuzzy.search("Carr", 2), [3, 5])
+        self.assertEqual(fuzzy.search("qqqq"), [])
@@ -2,7 +2,15 @@
 
 import unittest
 import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import exceptions
 from .. import manual
 from .. import interface
 from .. import makes
@@ -107,6 +115,42 @@ class TestInterface(unittest.TestCase):
             struct,
         )
 
+    def test_search_page(self):
+        everything = api3.search("member")["results"]
+        first = api3.search("member", size=1)
+
+        self.assertEqual(len(first["results"]), 1)
+        self.assertIn(first["results"][0], everything)
+        self.assertEqual(first["next_token"] is None, len(everything) == 1)
+
+        for size in (0, -1):
+            with self.assertRaises(exceptions.InvalidUsage):
+                api3.search("member", size=size)
+        with self.assertRaises(exceptions.InvalidUsage):
+            api3.search("member", size=1, mode="fuzzy")
+
+        page = json.loads(api1.page("functions", 5))
+        self.assertEqual(page["results"], api3.page("functions", 5)["results"])
+
+    def test_stream(self):
+        streamed = [json.loads(x) for x in api1.stream("functions")]
+        listed = fmt3.populate(man1.kinds(["function"], "list of functions").list())
+
+        self.assertEqual(streamed, listed)
+
+    def test_fetch_many(self):
+        rowids = [x["rowid"] for x in api3.search("member")["results"]]
+        self.assertEqual(api3.fetch_many(rowids), [api3.fetch(x) for x in rowids])
+
+    def test_text_search(self):
+        results = api3.search("vehicle", size=3, mode="text")["results"]
+        self.assertTrue(0 < len(results) <= 3)
+        self.assertEqual(
+            json.loads(api1.search("vehicle", size=3, mode="text"))["results"],
+            results,
+        )
+        self.assertEqual(api3.search(" ", mode="text")["results"], [])
+
 
 class TestMultipleInterfaces(unittest.TestCase):
     """
@@ -156,3 +200,74 @@ class TestMultipleInterfaces(unittest.TestCase):
         api2 = interface.Interface(man2, fmt2)
 
         self.assertEqual(api1.search("main"), json.loads(api2.search("main")))
+
+
+class TestReload(unittest.TestCase):
+    def test_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doxygen_sqlite3.db")
+            shutil.copy(TEST_DB, path)
+
+            def build():
+                man = manual.create(path, "reloaded").compile(manual.doxygen_manual)
+                man.mount("functions", man.kinds(["function"], "list of functions"))
+                man.publish()
+                return man
+
+            api = interface.Interface(build(), fmt3, build=build)
+            self.assertFalse(api.reload())
+
+            changed, unchanged = [
+                x.rowid for x in api.manual.iter_section("functions")
+            ][:2]
+            before, kept = api.fetch(changed), api.fetch(unchanged)
+
+            # a stream that's under way when the database is regenerated
+            records = api.stream("functions")
+            first = next(records)
+
+            # regenerate the database out from under the interface
+            regenerated = os.path.join(tmp, "regenerated.db")
+            shutil.copy(path, regenerated)
+            connection = sqlite3.connect(regenerated)
+            connection.execute("UPDATE meta SET generated_at='later'")
+            connection.execute(
+                "UPDATE memberdef SET briefdescription='changed' WHERE rowid=?",
+                (changed,),
+            )
+            connection.commit()
+            connection.close()
+            os.replace(regenerated, path)
+            old = api.manual
+            self.assertTrue(api.stale())
+
+            # hold the rebuild open while a thread the old manual hasn't served makes a request
+            building, release = threading.Event(), threading.Event()
+
+            def slow_build():
+                building.set()
+                release.wait()
+                return build()
+
+            api.build = slow_build
+            reloading = api.reload(background=True)
+            building.wait()
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                waiting = pool.submit(api.fetch_many, [changed])
+                release.set()
+                reloading.join()
+                # it waited for the new manual rather than failing
+                self.assertEqual(waiting.result()[0].briefdescription, "changed")
+            self.assertEqual(api.manual.meta().generated_at, "later")
+
+            # the stream finishes on the old manual, which is closed after that
+            rest = list(records)
+            self.assertEqual(len(rest) + 1, len(list(api.stream("functions"))))
+            self.assertNotEqual(first, rest[0])
+            with self.assertRaises(exceptions.StaleDatabase):
+                old.connection
+
+            # only the changed document's cache entry was dropped
+            self.assertIs(api.fetch(unchanged), kept)
+            self.assertNotEqual(api.fetch(changed), before)
+            self.assertEqual(api.fetch(changed).briefdescription, "changed")
@@ -8,8 +8,14 @@ Two main threads to exercising the manual API are:
 
 import unittest
 import os
+import json
+import shutil
+import sqlite3
+import tempfile
 
 from .. import manual
+from .. import sidecar
+from .. import views
 from .. import exceptions
 
 import xml.etree.ElementTree as ET
@@ -181,6 +187,148 @@ class TestViews(unittest.TestCase):
             len(vehicle.find("name", "base", relation=man.relations.get("methods")))
         )
 
+    def test_find_cache(self):
+        vehicle = man.struct_doc(name="Vehicle")
+        subclasses = man.relations.get("subclasses")
+
+        vehicle.find("name", "Car", relation=subclasses)
+        hits, misses = man.statement_cache.hits, man.statement_cache.misses
+
+        # a repeat search on the same relation+field reuses the prepared statement
+        self.assertTrue(len(vehicle.find("name", "Truck", relation=subclasses)))
+        self.assertEqual(man.statement_cache.hits, hits + 1)
+        self.assertEqual(man.statement_cache.misses, misses)
+
+    def test_search_path(self):
+        view = man.kinds(
+            ["class", "struct"],
+            "classes with subclasses",
+            search_relation=man.relations.get("subclasses"),
+            search_path=[man.relations.get("methods")],
+        )
+
+        # walk the path the long way, one relation at a time
+        walked = 0
+        for base in view.list():
+            for sub in man.relview.related(["subclasses"], base.rowid)["subclasses"]:
+                for method in man.relview.related(["methods"], sub.rowid)["methods"]:
+                    found = view.doc_search(base.name, [sub.name, method.name])
+                    self.assertIn(method, found)
+                    walked += 1
+        self.assertTrue(walked)
+
+        # tokens past the end of the path are ignored
+        self.assertEqual(
+            view.doc_search("Vehicle", ["Car", "vehicleStart", "extra"]),
+            view.doc_search("Vehicle", ["Car", "vehicleStart"]),
+        )
+
+    def test_directory(self):
+        for directory in man.connection.execute(
+            "select rowid, name from def where kind='dir'"
+        ):
+            listed = {x.rowid for x in man.directory(directory.name).list()}
+            contents = man.relview.related(["all_innercompounds"], directory.rowid)
+            self.assertEqual(listed, {x.rowid for x in contents["all_innercompounds"]})
+
+        # names are quoted into the view's SQL; a stray quote just matches nothing
+        with self.assertRaises(exceptions.IncompatibleBaseQuery):
+            man.directory("o'brien").list()
+
+    def test_related_combined(self):
+        vehicle = man.doc_search("Vehicle").pop().rowid
+        relations = ["members", "subclasses", "superclasses", "argument_links_in"]
+
+        combined = man.relview.related(relations, vehicle)
+        self.assertEqual(
+            combined, man.relview.related(relations, vehicle, combined=False)
+        )
+        self.assertEqual(
+            {type(x).__name__ for records in combined.values() for x in records},
+            {"stub"},
+        )
+
+        # the combined statement is cached per relation set
+        misses = man.statement_cache.misses
+        man.relview.related(relations, vehicle)
+        self.assertEqual(man.statement_cache.misses, misses)
+
+    def test_streaming(self):
+        functions = man.kinds(["function"], "list of functions")
+        self.assertEqual(list(functions.iter_list()), functions.list())
+
+        vehicle = man.struct_doc(name="Vehicle")
+        self.assertEqual(list(vehicle.iter_list()), vehicle.list())
+        self.assertEqual(
+            list(vehicle.iter_find("name", "vehicleStart")),
+            vehicle.find("name", "vehicleStart"),
+        )
+        self.assertEqual(
+            list(vehicle.iter_related("subclasses")),
+            vehicle.related(["subclasses"])["subclasses"],
+        )
+        self.assertEqual(list(man.iter_section("functions")), functions.list())
+
+    def test_page(self):
+        functions = man.kinds(["function"], "list of functions")
+
+        pages = [functions.page(10)]
+        while pages[-1].next_token:
+            pages.append(functions.page(10, pages[-1].next_token))
+
+        self.assertTrue(all(len(x.results) <= 10 for x in pages))
+        self.assertEqual(
+            [x for page in pages for x in page.results],
+            sorted(functions.list(), key=lambda x: x.rowid),
+        )
+
+        with self.assertRaises(exceptions.InvalidUsage):
+            functions.page(10, "not a token")
+
+    def test_subtree(self):
+        def walk(node, api=man):
+            children = api.relview.related(["subpages"], node.rowid)["subpages"]
+            if not children:
+                return node
+            return (node, [walk(x, api) for x in children])
+
+        def flatten(node):
+            if hasattr(node, "children"):
+                return (node.root, [flatten(x) for x in node.children])
+            return node
+
+        tree = man.page_tree(name="mypage1")
+        self.assertEqual(flatten(tree.subtree()), walk(tree.doc()))
+
+        shallow = tree.subtree(max_depth=1)
+        self.assertEqual(
+            [x.rowid for x in shallow.children], [x.rowid for x in tree.list()]
+        )
+        self.assertFalse(any(hasattr(x, "children") for x in shallow.children))
+
+        self.assertEqual(tree.subtree(max_depth=0).children, [])
+
+        # a page reachable two ways appears under both parents, but lists its own subpages once
+        branch = next(x for x in tree.subtree().children if hasattr(x, "children"))
+        other = man.connection.execute(
+            "select rowid from def where kind='page' and rowid not in (select outer_rowid from contains) and rowid not in (select inner_rowid from contains)"
+        ).fetchone()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doxygen_sqlite3.db")
+            shutil.copy(TEST_DB, path)
+            connection = sqlite3.connect(path)
+            connection.executemany(
+                "insert into contains (outer_rowid, inner_rowid) values (?, ?)",
+                [(tree.doc().rowid, other.rowid), (other.rowid, branch.root.rowid)],
+            )
+            connection.commit()
+            connection.close()
+
+            dag = manual.create(path, "dag").compile(manual.doxygen_manual)
+            dag_tree = dag.page_tree(name="mypage1")
+            self.assertEqual(flatten(dag_tree.subtree()), walk(dag_tree.doc(), dag))
+            dag.close()
+
     @unittest.skip(
         "This stopped working. Two newer examples, CMakeLists_8txt and page_8doc, match docview but not fileview."
     )
@@ -329,7 +477,7 @@ class TestManual(unittest.TestCase):
                 file_id=doc.file_id,
                 briefdescription="",
                 detaileddescription='<para> Our main function starts like this: <programlisting filename="include_test.cpp"></programlisting>First we create an object <computeroutput>t</computeroutput> of the <ref refid="classInclude__Test" kindref="compound">Include_Test</ref> class. <programlisting filename="include_test.cpp"></programlisting>Then we call the example member function <programlisting filename="include_test.cpp"></programlisting>After that our little test routine ends. <programlisting filename="include_test.cpp"></programlisting></para>\n',
-                relations=[],
+                relations=(),
             ),
         )
         self.assertIn(
@@ -376,7 +524,7 @@ class TestManual(unittest.TestCase):
                 detaileddescription="<para>More details about this function. </para>\n",
                 briefdescription="<para>An example member function. </para>\n",
                 inbodydescription="",
-                relations=["compounds"],
+                relations=("compounds",),
             ),
         )
 
@@ -407,6 +555,67 @@ class TestManual(unittest.TestCase):
             ],
         )
 
+    def test_doc_search_page(self):
+        results = sorted(man.doc_search("functions member"), key=lambda x: x.rowid)
+
+        first = man.doc_search_page("functions member", 3)
+        self.assertEqual(first.results, results[:3])
+
+        rest = man.doc_search_page("functions member", 3, first.next_token)
+        self.assertEqual(rest.results, results[3:])
+        self.assertIsNone(rest.next_token)
+
+        # naming a section pages through its listing
+        listing = sorted(man.kinds(["function"], "x").list(), key=lambda x: x.rowid)
+        first = man.doc_search_page("functions", 2)
+        self.assertEqual(first.results, listing[:2])
+        self.assertEqual(
+            man.doc_search_page("functions", 2, first.next_token).results, listing[2:4]
+        )
+
+        for size in (0, -1):
+            with self.assertRaises(exceptions.InvalidUsage):
+                man.doc_search_page("functions member", size)
+
+    def test_doc_search_ids(self):
+        for query in ("functions member", "structs Truck vehicleStart", "examp"):
+            results = man.doc_search(query)
+            self.assertEqual(
+                man.doc_search(query, ids_only=True), [x.rowid for x in results]
+            )
+
+            lazy = man.doc_search_lazy(query)
+            self.assertEqual(len(lazy), len(results))
+            self.assertEqual(list(lazy), results)
+
+        docs = man.doc_search_lazy("structs Truck vehicleStart", documents=True)
+        self.assertEqual(docs[0].name, "vehicleStart")
+
+        # naming a section still just returns its structure
+        self.assertEqual(man.doc_search_lazy("modules"), man.doc_search("modules"))
+
+        vehicle = man.struct_doc(name="Vehicle")
+        self.assertEqual(
+            vehicle.find("name", "vehicleStart", ids_only=True),
+            [x.rowid for x in vehicle.find("name", "vehicleStart")],
+        )
+
+        # unknown rowids hydrate as None, as in doc_fetch_many
+        self.assertEqual(man.stubs([-1]), [None])
+
+    def test_search_sections(self):
+        for target, tokens in (("Vehicle", []), ("Truck", ["vehicleStart"]), ("x", [])):
+            # one section at a time, in mount order
+            serial = []
+            for _name, section, _subsections in man.sections:
+                serial.extend(section.doc_search(target, list(tokens)) or ())
+
+            self.assertEqual(man._search_sections(target, tokens), serial)
+            self.assertEqual(
+                man._search_sections(target, tokens, ids_only=True),
+                [x.rowid for x in serial],
+            )
+
     def test_doc_fake_relation(self):
         with self.assertRaises(exceptions.RequiredRelationMissing):
             man.doc_related(1, ["fake_relation"])
@@ -429,6 +638,98 @@ class TestManual(unittest.TestCase):
         class_names = {x.name for x in memb_rels["compounds"]}
         self.assertEqual(class_names, {"Car", "Truck", "Vehicle"})
 
+    def test_doc_fetch_relations(self):
+        car = man.doc_fetch(man.doc_search("Car").pop().rowid)
+        truck = man.doc_fetch(man.doc_search("Truck").pop().rowid)
+
+        # documents with the same combination of relations share one tuple
+        self.assertEqual(car.relations, truck.relations)
+        self.assertIs(car.relations, truck.relations)
+        self.assertIn("superclasses", car.relations)
+
+    def test_doc_fetch_many(self):
+        rowids = [x.rowid for x in man.doc_search("member")]
+        rowids += [man.doc_search("Vehicle").pop().rowid, -1, rowids[0]]
+
+        self.assertEqual(man.doc_fetch_many(rowids), [man.doc_fetch(x) for x in rowids])
+        self.assertIsNone(man.doc_fetch_many(rowids)[-2])
+
+    def test_fuzzy_search(self):
+        self.assertEqual(man.doc_search("vehicelStart"), [])
+
+        typo = man.doc_search("vehicelStart", fuzzy=True)
+        self.assertEqual(typo[0].name, "vehicleStart")
+        self.assertEqual(
+            man.doc_search("vehicelStart", fuzzy=True, ids_only=True),
+            [x.rowid for x in typo],
+        )
+        # fuzzy results are only a fallback
+        self.assertEqual(
+            man.doc_search("Vehicle", fuzzy=True), man.doc_search("Vehicle")
+        )
+
+    def test_text_search(self):
+        results = man.text_search("vehicle")
+        self.assertIn("Vehicle", [x.name for x in results])
+        # names outrank descriptions
+        self.assertIn("vehicle", results[0].name.lower())
+
+        self.assertEqual(len(man.text_search("vehicle", 1)), 1)
+        self.assertEqual(
+            man.text_search(sidecar.match_terms("absent_minded_member")), []
+        )
+        self.assertEqual(man.text_search(sidecar.match_terms("  ")), [])
+
+        with self.assertRaises(exceptions.MalformedQuery):
+            man.text_search('unbalanced "quote')
+
+    def test_lazy_mount(self):
+        lazy = manual.create(TEST_DB, "lazy manual").compile(manual.doxygen_manual)
+        functions = lazy.kinds(["function"], "list of functions")
+        lazy.mount("functions", functions)
+
+        # compile() already mounted the manual's own sections
+        _name, section, listing = lazy.sections[-1]
+        self.assertIs(section, functions)
+        self.assertIsNone(listing._items)
+
+        self.assertEqual(listing, functions.doc_structure())
+        self.assertEqual(list(listing), functions.list())
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "manual.json")
+            man.save_snapshot(path)
+            loaded = manual.load_snapshot(path, TEST_DB)
+
+            self.assertEqual(loaded.root, man.root)
+            self.assertEqual(loaded.documents, man.documents)
+            self.assertEqual(
+                [(x[0], list(x[2])) for x in loaded.sections[1:]],
+                [(x[0], list(x[2])) for x in man.sections[1:]],
+            )
+            for query in ("structs Truck vehicleStart", "ah vehicleStart", "Vehicle"):
+                self.assertEqual(loaded.doc_search(query), man.doc_search(query))
+
+            # views record the sidecar builds they read, and only those are restored (not, i.e., the full-text index)
+            man.text_search("vehicle")
+            structs = man.topmost(["struct"], "structs")
+            self.assertEqual(structs.snapshot()["builds"], ["topmost:struct"])
+            self.assertEqual(
+                views.ListView.restore(loaded, structs.snapshot()).list(),
+                structs.list(),
+            )
+            self.assertNotIn("text", loaded.sidecar._built)
+
+            # a snapshot of some other database won't load
+            with open(path) as file:
+                state = json.load(file)
+            state["meta"] = [["generated_at"], ["some other time"]]
+            with open(path, "w") as file:
+                json.dump(state, file)
+            with self.assertRaises(exceptions.StaleSnapshot):
+                manual.load_snapshot(path, TEST_DB)
+
     # TODO: this name might be bad. It's not obvious if this tests something about the structure of a view, or tests a view method named structure, or what?
     def test_view_structure(self):
         docview = man.doc_search("ah").pop()
@@ -98,6 +98,21 @@ class TestStatementCore(unittest.TestCase):
             "SELECT table.one, table.two FROM table WHERE foo='bar' LIMIT 3",
         )
 
+    def test_shared_clauses(self):
+        one = sql.Statement(None).table("table", "id")
+        two = sql.Statement(None, one)
+
+        # extending shares clauses until one side is modified
+        self.assertIs(two.clauses, one.clauses)
+
+        two.where(foo="bar")
+        self.assertIsNot(two.clauses, one.clauses)
+        self.assertNotIn("where", one.clauses)
+
+        # identical clauses render once
+        three = sql.Statement(None, one)
+        self.assertIs(one.prepare()._full_query, three.prepare()._full_query)
+
     def test_frozen_statement(self):
         with self.assertRaises(exceptions.FrozenStatement):
             one = (
@@ -108,12 +123,55 @@ class TestStatementCore(unittest.TestCase):
 
             one.limit(1)
 
+        # the builder that produced it is frozen as well
+        builder = sql.Statement(None).table("table", "id")
+        builder.prepare()
+        with self.assertRaises(exceptions.FrozenStatement):
+            builder.where(foo="bar")
+
+    def test_bulk_query(self):
+        ob = sql.Statement(None).table("table", "id").prepare()
+        self.assertEqual(
+            ob._bulk_query(3), "SELECT * FROM table WHERE table.id IN (?, ?, ?)"
+        )
+
+        ob = sql.Statement(None).table("table", "id").where(foo=None).limit(5).prepare()
+        self.assertEqual(
+            ob._bulk_query(2),
+            "SELECT * FROM table WHERE foo=? AND table.id IN (?, ?) LIMIT 5",
+        )
+
+    def test_aliased_id(self):
+        ob = sql.Statement(None).table("table", "id")._from("table base")._id("base.id")
+        ob = ob.prepare()
+        self.assertEqual(ob._ids_only, "SELECT base.id FROM table base")
+        self.assertEqual(
+            ob._bulk_query(1), "SELECT * FROM table base WHERE base.id IN (?)"
+        )
+
     def test_override_select(self):
         base = sql.Statement(None).table("table", "id", columns=["one", "two"])
         ob = base._select("count(*)").prepare()
         self.assertEqual(ob._full_query, "SELECT count(*) FROM table")
 
 
+class TestStatementCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = sql.StatementCache()
+
+        def build():
+            return sql.Statement(None).table("table", "id").where(foo=None).prepare()
+
+        one = cache.get(("table", "foo"), build)
+        two = cache.get(("table", "foo"), build)
+
+        self.assertIs(one, two)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+
 # TODO: need to collect some examples of more complex usage patterns from the manual in order to flesh out some cases that stretch complex joins, column arrangements, where clauses, subqueries, etc.
 class TestComplexStatements(unittest.TestCase):
     pass
@@ -1,6 +1,99 @@
 from . import sql
 from . import exceptions
 
+# bounds DocView.subtree() when no max_depth is given (and keeps cyclic relations finite)
+MAX_TREE_DEPTH = 64
+
+
+def fetch(cursor, ids_only=False):
+    """Fetch all rows from cursor; just the bare rowids for ids_only cursors."""
+    if ids_only:
+        return [x[0] for x in cursor]
+    return cursor.fetchall()
+
+
+class Deferred(object):
+    """
+    A sequence of results that only holds rowids until its records are consumed.
+
+    Records are hydrated on demand, batch_size at a time, by calling hydrate(rowids), which must return records in the same order. Pairs with id-first searches (i.e., Manual.doc_search(ids_only=True)) for large result sets where a consumer only looks at the first few records.
+    """
+
+    batch_size = 32
+    rowids = hydrate = _batches = None
+
+    def __init__(self, rowids, hydrate, batch_size=None):
+        self.rowids = list(rowids)
+        self.hydrate = hydrate
+        self.batch_size = batch_size or self.batch_size
+        self._batches = {}
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def _batch(self, number):
+        try:
+            return self._batches[number]
+        except KeyError:
+            start = number * self.batch_size
+            batch = self._batches[number] = self.hydrate(
+                self.rowids[start : start + self.batch_size]
+            )
+            return batch
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Deferred index out of range")
+
+        return self._batch(index // self.batch_size)[index % self.batch_size]
+
+    def __iter__(self):
+        for number in range(0, (len(self) + self.batch_size - 1) // self.batch_size):
+            yield from self._batch(number)
+
+
+class Lazy(object):
+    """
+    A sequence that isn't computed until something looks at it.
+
+    The first access calls compute() (which must return a list) and keeps its result. Lets a manual mount sections (see Manual.mount) without listing them up front.
+    """
+
+    compute = _items = None
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = self.compute()
+        return self._items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __eq__(self, other):
+        if isinstance(other, Lazy):
+            other = other.items
+        return self.items == other
+
+    def __repr__(self):
+        if self._items is None:
+            return "<Lazy (not yet computed)>"
+        return repr(self._items)
+
 
 class View(object):
     """
@@ -13,16 +106,78 @@ class View(object):
     api = None
 
     _relation_queries = _find_queries = None
+    # names of the sidecar builds this view's queries read (see _requires)
+    _builds = None
+    # relations that doc_search follows for successive tokens, and whether its first token matches the base records themselves (vs. records one hop down the path)
+    _search_path = ()
+    _path_anchored = True
 
     def __init__(self, base):
         self.api = base.api
         self._relation_queries = {}
         self._find_queries = {}
+        self._builds = set()
+        # every query reads the API's def table (an indexed sidecar copy, with indexed=True)
+        self._requires(self.api.sidecar.tables.get(self.api.def_table))
 
         self.base_query = base.prepare()
 
         return
 
+    def snapshot(self):
+        """Return this view's compiled state as plain (JSON-serializable) data; see restore and Manual.save_snapshot."""
+        return {
+            "view": type(self).__name__,
+            "base_query": self.base_query.dump(),
+            "relation_queries": {
+                k: v.dump() for k, v in self._relation_queries.items()
+            },
+            "search_relation": self._search_relation,
+            "search_path": self._search_path,
+            "root": self.root and self.api.types.dump(self.root),
+            "builds": sorted(self._builds),
+        }
+
+    @classmethod
+    def restore(cls, api, state):
+        """Rebuild a view from snapshot() state, without re-running (or re-validating) its queries, though it does make sure the sidecar builds they read are there."""
+
+        def relation(fields):
+            name, direction, atom, kinds = fields
+            return api.relations.template(name, direction, atom, kinds and tuple(kinds))
+
+        api.sidecar.restore(state["builds"])
+        view = cls.__new__(cls)
+        view.api = api
+        view._builds = set(state["builds"])
+        view.base_query = sql.PreparedStatement.load(api, state["base_query"])
+        view._relation_queries = {
+            k: sql.PreparedStatement.load(api, v)
+            for k, v in state["relation_queries"].items()
+        }
+        # find queries get rebuilt from the relation queries on demand
+        view._find_queries = {}
+        view._search_path = tuple(relation(x) for x in state["search_path"])
+        if state["search_relation"]:
+            view._search_relation = relation(state["search_relation"])
+            view._search_query = view._relation_queries[view._search_relation.name]
+        if state["root"]:
+            view.root = api.types.load(state["root"])
+        return view
+
+    def _requires(self, build):
+        """Note that this view's queries read tables the named sidecar build creates, so restore() can make sure they're there."""
+        if build:
+            self._builds.add(build)
+
+    def _probe(self, limit):
+        """Return up to limit records from the base query; enough to validate it without listing everything."""
+        probe = self.api.statement_cache.get(
+            (self.base_query._full_query, None, ("probe",)),
+            lambda: sql.Statement(self.api, self.base_query)._limit("?").prepare(),
+        )
+        return probe(limit).fetchall()
+
     def brief(self):
         raise NotImplementedError()
 
@@ -52,6 +207,22 @@ class View(object):
         result = self.base_query().fetchone()
         return result
 
+    def _atom(self, direction, relation):
+        """Return the table and the from/to column prefixes for following a relation atom in direction."""
+        table = from_prefix = to_prefix = None
+
+        # flip the relationship atom's prefixes based on direction.
+        if direction == "child":
+            name, table, from_prefix, to_prefix = self.api.atoms.get(relation)
+        elif direction == "parent":
+            name, table, to_prefix, from_prefix = self.api.atoms.get(relation)
+
+        # derived tables (i.e., closures) get built on first use
+        self.api.sidecar.require(table)
+        self._requires(self.api.sidecar.tables.get(table))
+
+        return table, from_prefix, to_prefix
+
     def _build_relation(
         self, alias, query, direction="child", relation=None, kinds=None
     ):
@@ -64,24 +235,20 @@ class View(object):
 
         The (currently disabled) 'where' property enables further narrowing (in case a relation should be restricted to specific kinds or records). Also accompanied by a kwarg where=None
         """
-        table = from_prefix = to_prefix = None
-
-        # flip the relationship atom's prefixes based on direction.
-        if direction == "child":
-            name, table, from_prefix, to_prefix = self.api.atoms.get(relation)
-        elif direction == "parent":
-            name, table, to_prefix, from_prefix = self.api.atoms.get(relation)
+        table, from_prefix, to_prefix = self._atom(direction, relation)
 
         statement = (
             sql.Statement(self.api, query)
             ._select("[{alias}].*".format(alias=alias))
-            ._from("def base")
+            ._from("{} base".format(self.api.def_table))
+            ._id("[{alias}].rowid".format(alias=alias))
             ._join(
-                conditions="{table} as relative ON base.rowid=relative.{from_prefix}_rowid JOIN def [{alias}] ON [{alias}].rowid=relative.{to_prefix}_rowid".format(
+                conditions="{table} as relative ON base.rowid=relative.{from_prefix}_rowid JOIN {def_table} [{alias}] ON [{alias}].rowid=relative.{to_prefix}_rowid".format(
                     alias=alias,
                     from_prefix=from_prefix,
                     to_prefix=to_prefix,
                     table=table,
+                    def_table=self.api.def_table,
                 )
             )
         )
@@ -92,12 +259,12 @@ class View(object):
         # if where:
         #     statement.where(**where)
 
-        self._relation_queries[alias] = statement.prepare()
-        return statement
+        prepared = self._relation_queries[alias] = statement.prepare()
+        return prepared
 
-    def _relation(self, *arg, relation=None):
+    def _relation_query(self, relation):
         # related(kind) queries are lazily constructed on first call using the root sql.Statement object, and adding relevant joins
-        # 1. see if it's cached; call if so, try to build if not
+        # 1. see if it's cached; return if so, try to build if not
         # 2. see if it's a known relation with predefined join names; actually build if so, raise error if not
         if relation not in self._relation_queries:
             rel = self.api.relations.get(relation)
@@ -105,37 +272,171 @@ class View(object):
                 rel[0], self.base_query, direction=rel[1], relation=rel[2], kinds=rel[3]
             )
 
+        return self._relation_queries[relation]
+
+    def _relation(self, *arg, relation=None):
         # this could fail, but I don't know how likely it is and I don't understand the conditions well enough to raise a sensible exception yet.
-        return self._relation_queries[relation](*arg)
+        return self._relation_query(relation)(*arg)
 
-    def related(self, relations, *arg):
-        return {x: self._relation(*arg, relation=x).fetchall() for x in relations}
+    def related(self, relations, *arg, combined=True):
+        """
+        Return a dict of the records in each of relations.
 
-    def doc_search(self, topic, tokens=None):
+        Multiple relations are fetched in one round trip (combined into a single UNION ALL query, cached per set of relations) unless combined is False.
         """
+        relations = tuple(dict.fromkeys(relations))
+        if not combined or len(relations) < 2:
+            return {x: self._relation(*arg, relation=x).fetchall() for x in relations}
+
+        query = self.api.statement_cache.get(
+            (self.base_query._full_query, relations, ("related",)),
+            lambda: sql.Union(
+                self.api, {x: self._relation_query(x) for x in relations}
+            ),
+        )
+        cursor = query(*arg)
+        record = self.api.types.for_description(cursor.description[1:])
+
+        results = {x: [] for x in relations}
+        for row in cursor:
+            results[row[0]].append(record(*row[1:]))
+        return results
+
+    def iter_related(self, relation, *arg):
+        """Stream records of a single relation."""
+        return sql.stream(self._relation(*arg, relation=relation))
+
+    def doc_search(self, topic, tokens=None, ids_only=False):
         """
-        match = self.find("name", topic)
+        Search for topic, drilling down the search path for as many tokens as it has relations.
 
-        if match and tokens and len(tokens) and self._search_relation:
-            return self.find_related(
-                match[0].rowid, "name", tokens[0], relation=self._search_relation
-            )
+        However deep, the search compiles into one query (see _path_statement). With ids_only, return rowids instead of records.
+        """
+        search, args = self._path_search("name", [topic, *(tokens or ())])
+        return fetch(search(*args, ids_only=ids_only), ids_only)
+
+    def _path_search(self, field, terms):
+        """Return the path statement for searching terms, and the terms it binds."""
+        # without a search path, even views anchored below the base match the base records
+        anchored = self._path_anchored or not self._search_path
+        relations = self._search_path[: len(terms) - anchored]
+        return (
+            self._path_statement(field, relations, anchored),
+            terms[: len(relations) + anchored],
+        )
 
-        return match
+    def _path_page(self, field, terms, size, token=None):
+        """Return one keyset page of the records a path search (see _path_search) for terms finds."""
+        search, args = self._path_search(field, terms)
+        return self._keyset_page(search, size, token, *args)
 
-    def find_related(self, rowid, field, term, relation):
-        # TODO: I think this is cacheable by relname+field, but I'm not sure if it's the same cache as the other location
-        search = (
-            sql.Statement(self.api, self._find_queries[relation.name])
-            .where(**{"base.rowid": None, "{}.{}".format(relation.name, field): None})
-            .prepare()
+    def _keyset_page(self, statement, size, token=None, *args):
+        """
+        Return one page (up to size records, in rowid order) of statement's results, plus a token for the next page.
+
+        args bind statement's own parameters. The keyset restriction (key above the token's rowid, ordered by key, limited to size + 1 to see if there's another page) goes into a cached copy of statement.
+        """
+        sql.check_page_size(size)
+        key = statement.clauses["key"]
+        query = self.api.statement_cache.get(
+            (statement._full_query, None, ("page",)),
+            lambda: sql.Statement(self.api, statement)
+            .where("{}>?".format(key))
+            .order_by(key)
+            ._limit("?")
+            .prepare(),
         )
+        results = query(*args, sql.keyset_rowid(token), size + 1).fetchall()
 
-        return search(rowid, term).fetchall()
+        return self.api.types.get("paged")(
+            results[:size],
+            sql.keyset_token(results[size - 1].rowid) if len(results) > size else None,
+        )
+
+    def _path_statement(self, field, relations, anchored=True):
+        """
+        Compile a search along a path of relations into a single prepared statement.
 
-    def find(self, field, term, relation=None):
+        The statement joins one step per relation onto the base query, and takes a parameter per step to match against that step's field; if anchored, it takes a leading parameter for the base records' field as well. It returns the records at the end of the path. Statements are cached on the API, like searches.
         """
-        Return records where field matches term, optionally searching across a relation.
+
+        def build():
+            joins = []
+            where = ["base.{}=?".format(field)] if anchored else []
+            previous = "base"
+            for step, relation in enumerate(relations, 1):
+                table, from_prefix, to_prefix = self._atom(
+                    relation.direction, relation.atom
+                )
+                alias = "[step{}]".format(step)
+                joins.append(
+                    "{table} AS [step{step}_relative] ON [step{step}_relative].{from_prefix}_rowid={previous}.rowid JOIN {def_table} {alias} ON {alias}.rowid=[step{step}_relative].{to_prefix}_rowid".format(
+                        table=table,
+                        step=step,
+                        from_prefix=from_prefix,
+                        to_prefix=to_prefix,
+                        previous=previous,
+                        def_table=self.api.def_table,
+                        alias=alias,
+                    )
+                )
+                if relation.kinds:
+                    where.append(
+                        "{}.kind in ('{}')".format(alias, "','".join(relation.kinds))
+                    )
+                where.append("{}.{}=?".format(alias, field))
+                previous = alias
+
+            statement = sql.Statement(self.api, self.base_query)
+            if joins:
+                statement._select("{}.*".format(previous))._id(
+                    "{}.rowid".format(previous)
+                )._join(conditions=" JOIN ".join(joins))
+            return statement.where(*where).prepare()
+
+        return self.api.statement_cache.get(
+            (
+                self.base_query._full_query,
+                tuple(x.name for x in relations),
+                ("path", field, anchored),
+            ),
+            build,
+        )
+
+    def find_related(self, rowid, field, term, relation, ids_only=False):
+        search = self._search_statement(
+            relation.name, "base.rowid", "{}.{}".format(relation.name, field)
+        )
+
+        return fetch(search(rowid, term, ids_only=ids_only), ids_only)
+
+    def _search_statement(self, relname, *columns):
+        """
+        Return a prepared statement matching each of columns against a parameter.
+
+        Statements are cached on the API, keyed by the find query they extend, the relation, and the columns, so repeat searches only pay for the execute.
+        """
+        base = self._find_queries[relname]
+
+        return self.api.statement_cache.get(
+            (base._full_query, relname, columns),
+            lambda: sql.Statement(self.api, base)
+            .where(**dict.fromkeys(columns))
+            .prepare(),
+        )
+
+    def find(self, field, term, relation=None, ids_only=False):
+        return fetch(
+            self._find(field, term, relation=relation, ids_only=ids_only), ids_only
+        )
+
+    def iter_find(self, field, term, relation=None):
+        """Like find(), but stream the matches."""
+        return sql.stream(self._find(field, term, relation=relation))
+
+    def _find(self, field, term, relation=None, ids_only=False):
+        """
+        Return a cursor over records where field matches term, optionally searching across a relation.
 
         TODO: this might have errors or be open to a refactor now. I've made two big changes:
         - relation is typically a relation *object* and not a string name now (not sure I love this)
@@ -165,21 +466,12 @@ class View(object):
                         # TODO: where useful?
                     )
 
-        # TODO: These entire searches are cacheable per relation+field, but not sure it's worth optimizing for now
         if relation:
-            search = (
-                sql.Statement(self.api, self._find_queries[relname])
-                .where(**{"{}.{}".format(relname, field): None})
-                .prepare()
-            )
+            search = self._search_statement(relname, "{}.{}".format(relname, field))
         else:
-            search = (
-                sql.Statement(self.api, self._find_queries[relname])
-                .where(**{"{}".format(field): None})
-                .prepare()
-            )
+            search = self._search_statement(relname, field)
 
-        return search(term).fetchall()
+        return search(term, ids_only=ids_only)
 
 
 class ListView(View):
@@ -190,14 +482,18 @@ class ListView(View):
     brief_description = None
     _search_relation = _search_query = None
 
-    def __init__(self, base, brief_description, search_relation=None):
+    def __init__(self, base, brief_description, search_relation=None, search_path=None):
+        """
+        A search of this view matches its first token against the listed records, and then follows search_relation (and, for any further tokens, each relation in search_path) one token at a time.
+        """
         super().__init__(base)
 
-        result = base().fetchall()
+        result = self._probe(1)
         self.brief_description = brief_description
 
         if search_relation:
             self._search_relation = search_relation
+            self._search_path = (search_relation, *(search_path or ()))
 
             statement = self._build_relation(
                 search_relation[0],
@@ -212,7 +508,7 @@ class ListView(View):
             pass
         else:
             raise exceptions.IncompatibleBaseQuery(
-                "base query matches no documents", self, base, result
+                "base query matches no documents", self, self.base_query, result
             )
 
     def list(self):
@@ -223,12 +519,37 @@ class ListView(View):
         """
         return self.base_query().fetchall()
 
-    def structure(self, **kwarg):
-        return self.api.types.get("section")(self.brief(), self.list(), "section", None)
+    def iter_list(self):
+        """Like list(), but stream records in chunks instead of fetching them all at once."""
+        return sql.stream(self.base_query())
+
+    def page(self, size, token=None):
+        """
+        Return one page (up to size records, in rowid order) of the list, plus a token for the next page.
+
+        This is keyset pagination: the token encodes the last rowid returned, so any page costs an index seek rather than skipping over (or fetching) everything before it. The token is None on the last page.
+        """
+        return self._keyset_page(self.base_query, size, token)
+
+    def structure(self, children=None, **kwarg):
+        return self.api.types.get("section")(
+            self.brief(), self.list() if children is None else children, "section", None
+        )
 
     def brief(self):
         return self.brief_description
 
+    def snapshot(self):
+        state = super().snapshot()
+        state["brief_description"] = self.brief_description
+        return state
+
+    @classmethod
+    def restore(cls, api, state):
+        view = super().restore(api, state)
+        view.brief_description = state["brief_description"]
+        return view
+
 
 class DocView(View):
     """
@@ -237,13 +558,23 @@ class DocView(View):
 
     _search_relation = _search_query = None
 
-    def __init__(self, base, search_relation=None):
+    _path_anchored = False
+
+    def __init__(self, base, search_relation=None, search_path=None):
+        """
+        A search of this view matches its first token against records search_relation leads to from the document, and then follows each relation in search_path (by default, search_relation again) one token at a time.
+        """
         super().__init__(base)
 
-        result = base().fetchall()
+        # more than one is an error; no need to find out how many more
+        result = self._probe(2)
 
         if search_relation:
             self._search_relation = search_relation
+            self._search_path = (
+                search_relation,
+                *(search_path if search_path is not None else (search_relation,)),
+            )
 
             statement = self._build_relation(
                 search_relation[0],
@@ -256,13 +587,16 @@ class DocView(View):
 
         if len(result) > 1:
             raise exceptions.IncompatibleBaseQuery(
-                "base query may not match more than one record.", self, base, result
+                "base query may not match more than one record.",
+                self,
+                self.base_query,
+                result,
             )
         elif len(result) == 1:
             self.root = result[0]
         else:
             raise exceptions.IncompatibleBaseQuery(
-                "base query matches no documents", self, base, result
+                "base query matches no documents", self, self.base_query, result
             )
 
     def list(self):
@@ -273,16 +607,117 @@ class DocView(View):
         """
         return self._relation_queries[self._search_relation[0]]().fetchall()
 
-    def structure(self, **kwarg):
+    def iter_list(self):
+        """Like list(), but stream records in chunks instead of fetching them all at once."""
+        return sql.stream(self._relation_queries[self._search_relation[0]]())
+
+    def page(self, size, token=None):
+        """Return one page (up to size records, in rowid order) of the list, plus a token for the next page; see ListView.page."""
+        return self._keyset_page(
+            self._relation_queries[self._search_relation[0]], size, token
+        )
+
+    def structure(self, children=None, **kwarg):
         return self.api.types.get("section")(
-            self.brief(), self.list(), "section", self.doc()
+            self.brief(),
+            self.list() if children is None else children,
+            "section",
+            self.doc(),
+        )
+
+    def subtree(self, relation=None, max_depth=None):
+        """
+        Return the tree below this view's document as nested sections, following relation (by name; defaults to the search relation) up to max_depth levels down.
+
+        The whole tree comes from one recursive query. Nodes with children are sections (rooted at their stub); leaves are plain stubs.
+        """
+        if relation is None:
+            if not self._search_relation:
+                raise exceptions.InvalidUsage(
+                    "subtree() needs a relation on views without a search relation"
+                )
+            relation = self._search_relation.name
+        relation = self.api.relations.get(relation)
+        query = self.api.statement_cache.get(
+            (self.base_query._full_query, relation.name, ("subtree",)),
+            lambda: self._subtree_statement(relation),
+        )
+
+        children = {}
+        stub = self.api.types.get("stub")
+        for row in sql.stream(
+            query(MAX_TREE_DEPTH if max_depth is None else max_depth)
+        ):
+            children.setdefault(row[0], []).append(stub(*row[1:]))
+
+        section = self.api.types.get("section")
+        built = {}
+
+        def build(node):
+            if node.rowid not in children:
+                return node
+            if node.rowid not in built:
+                # placeholder; keeps a cyclic relation from recursing forever
+                built[node.rowid] = node
+                built[node.rowid] = section(
+                    node.summary,
+                    [build(x) for x in children[node.rowid]],
+                    "section",
+                    node,
+                )
+            return built[node.rowid]
+
+        root = self.doc()
+        return section(
+            root.summary,
+            [build(x) for x in children.get(root.rowid, [])],
+            "section",
+            root,
+        )
+
+    def _subtree_statement(self, relation):
+        table, from_prefix, to_prefix = self._atom(relation.direction, relation.atom)
+        kinds = ""
+        if relation.kinds:
+            kinds = " JOIN {def_table} step ON step.rowid=relative.{to_prefix}_rowid AND step.kind in ('{kinds}')".format(
+                def_table=self.api.def_table,
+                to_prefix=to_prefix,
+                kinds="','".join(relation.kinds),
+            )
+
+        return (
+            sql.Statement(self.api, self.api._def)
+            ._with(
+                "RECURSIVE tree(rowid, parent, depth) AS ({seed} UNION ALL SELECT relative.{to_prefix}_rowid, tree.rowid, tree.depth + 1 FROM tree JOIN {table} relative ON relative.{from_prefix}_rowid=tree.rowid{kinds} WHERE tree.depth < ?)".format(
+                    seed=self.base_query.clauses.render(
+                        self.base_query.template, select="SELECT base.rowid, NULL, 0"
+                    ),
+                    table=table,
+                    from_prefix=from_prefix,
+                    to_prefix=to_prefix,
+                    kinds=kinds,
+                )
+            )
+            # a node reachable by more than one path gets expanded once per path
+            ._select(
+                "DISTINCT tree.parent, node.rowid, node.refid, node.kind, node.name, node.summary"
+            )
+            ._from("tree")
+            ._join(
+                conditions="{} node ON node.rowid=tree.rowid".format(self.api.def_table)
+            )
+            ._where("tree.parent IS NOT NULL")
+            ._id("node.rowid")
+            .prepare()
         )
 
     def brief(self):
         return self.doc().summary
 
-    def find(self, field, term, relation=None):
-        return super().find(field, term, relation=relation or self._search_relation)
+    def _find(self, field, term, relation=None, ids_only=False):
+        return super()._find(
+            field, term, relation=relation or self._search_relation, ids_only=ids_only
+        )
 
 
 class RelationView(DocView):